@@ -0,0 +1,127 @@
+"""
+Subscriber harness for the collective alert stream.
+
+    python bench_alert_subscribers.py --subscribers 2000
+    python bench_alert_subscribers.py --local --subscribers 50000
+
+HTTP mode opens N SSE connections to a running server, waits for every
+snapshot, files enough reports in a fresh district to trip an alert, and
+reports how many subscribers received it and how quickly. --local drives the
+in-process hub directly to show fan-out cost and memory per subscriber.
+Raise the open-file limit (ulimit -n) before large HTTP runs.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+import uuid
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+async def bench_http(url: str, subscribers: int):
+    import httpx
+
+    district = f"Bench {uuid.uuid4().hex[:8]}"
+    ready = asyncio.Event()
+    connected = 0
+    received = []
+
+    async def subscriber(client):
+        nonlocal connected
+        async with client.stream("GET", f"{url}/api/collective/alerts/stream", params={"district": district}) as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event == "snapshot":
+                    connected += 1
+                    if connected == subscribers:
+                        ready.set()
+                elif line.startswith("data: ") and event == "alert":
+                    received.append(time.perf_counter())
+                    return
+
+    limits = httpx.Limits(max_connections=subscribers + 10, max_keepalive_connections=0)
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60, read=None)) as client:
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(subscriber(client)) for _ in range(subscribers)]
+        try:
+            await asyncio.wait_for(ready.wait(), timeout=120)
+        except asyncio.TimeoutError:
+            print(f"Only {connected}/{subscribers} subscribers connected")
+        print(f"{connected} subscribers connected in {time.perf_counter() - start:.1f}s")
+
+        # Enough reports in one burst to cross the High threshold against an empty baseline
+        fired = time.perf_counter()
+        await asyncio.gather(*(
+            client.post(f"{url}/api/collective/report", json={"issue": "Bench Pest", "district": district})
+            for _ in range(10)
+        ))
+        await asyncio.wait(tasks, timeout=30)
+        for task in tasks:
+            task.cancel()
+
+        latencies = [(t - fired) * 1000 for t in received]
+        print(f"Alert delivered to {len(received)}/{connected} subscribers")
+        if latencies:
+            print(f"Delivery ms: p50 {percentile(latencies, 0.5):.0f}  p99 {percentile(latencies, 0.99):.0f}  "
+                  f"max {max(latencies):.0f}")
+        print((await client.get(f"{url}/metrics")).json().get("collective_alerts"))
+
+
+async def bench_local(subscribers: int, messages: int):
+    from services.alert_hub import AlertHub
+
+    hub = AlertHub(queue_size=32, max_subscribers=subscribers, max_dropped=100)
+    received = 0
+    done = asyncio.Event()
+
+    async def consumer(sub):
+        nonlocal received
+        while True:
+            await sub.get()
+            received += 1
+            if received == subscribers * messages:
+                done.set()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subs = [hub.subscribe(["district:Dharwad"]) for _ in range(subscribers)]
+    tasks = [asyncio.create_task(consumer(sub)) for sub in subs]
+    await asyncio.sleep(0)
+    per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / subscribers
+    tracemalloc.stop()
+
+    publish_ms = []
+    start = time.perf_counter()
+    for i in range(messages):
+        t = time.perf_counter()
+        hub.publish(["district:Dharwad"], {"issue": "Aphids", "risk": "High", "n": i})
+        publish_ms.append((time.perf_counter() - t) * 1000)
+        await asyncio.sleep(0)
+    await asyncio.wait_for(done.wait(), timeout=60)
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+
+    print(f"{subscribers} subscribers, ~{per_subscriber / 1024:.1f} KiB each (queue + consumer task)")
+    print(f"publish() fan-out ms: p50 {percentile(publish_ms, 0.5):.2f}  max {max(publish_ms):.2f}")
+    print(f"{received} deliveries in {elapsed:.2f}s ({received / elapsed:.0f}/s), hub {hub.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=20, help="messages to publish in --local mode")
+    parser.add_argument("--local", action="store_true", help="benchmark the hub in-process, without HTTP")
+    args = parser.parse_args()
+
+    if args.local:
+        asyncio.run(bench_local(args.subscribers, args.messages))
+    else:
+        asyncio.run(bench_http(args.url, args.subscribers))
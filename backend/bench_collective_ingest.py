@@ -0,0 +1,122 @@
+"""
+Burst benchmark for the collective report ingest pipeline.
+
+    python bench_collective_ingest.py --reports 20000 --concurrency 200
+    python bench_collective_ingest.py --local --reports 200000
+
+HTTP mode posts reports to a running server and prints handler latency
+percentiles, then waits for /metrics to show the writer has caught up.
+--local drives the queue and SQLite writer in-process, without HTTP, to
+measure the writer's own ceiling.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+
+ISSUES = ["Aphids", "Leaf Rust", "Whitefly", "Fall Armyworm", "Blast", "Late Blight", "Stem Borer"]
+DISTRICTS = ["Dharwad", "Belagavi", "Mysuru", "Nashik", "Pune", "Ludhiana", "Guntur", "Indore"]
+
+
+def make_report() -> dict:
+    return {
+        "issue": random.choice(ISSUES),
+        "district": random.choice(DISTRICTS),
+        "crop": random.choice(["Tomato", "Wheat", "Rice", "Cotton", None]),
+        "severity": random.choice(["low", "medium", "high"]),
+        "lat": round(random.uniform(12.0, 31.0), 4),
+        "lon": round(random.uniform(74.0, 81.0), 4),
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+async def bench_http(url: str, total: int, concurrency: int):
+    import httpx
+
+    latencies = []
+    statuses = {}
+    sent = 0
+
+    async def worker(client):
+        nonlocal sent
+        while sent < total:
+            sent += 1
+            start = time.perf_counter()
+            response = await client.post(f"{url}/api/collective/report", json=make_report())
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        before = (await client.get(f"{url}/metrics")).json().get("collective_ingest", {})
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        print(f"Sent {total} reports in {elapsed:.2f}s ({total / elapsed:.0f}/s), status codes {statuses}")
+        print(
+            f"Handler latency ms: p50 {percentile(latencies, 0.5):.1f}  p95 {percentile(latencies, 0.95):.1f}  "
+            f"p99 {percentile(latencies, 0.99):.1f}  max {max(latencies):.1f}"
+        )
+
+        accepted = statuses.get(202, 0)
+        target = before.get("written", 0) + before.get("dropped", 0) + accepted
+        while True:
+            ingest = (await client.get(f"{url}/metrics")).json()["collective_ingest"]
+            if ingest["written"] + ingest["dropped"] >= target:
+                break
+            await asyncio.sleep(0.05)
+        drained = time.perf_counter() - start
+        print(f"Writer caught up after {drained:.2f}s ({accepted / drained:.0f} reports/s end to end)")
+        print(f"Writer: avg batch {ingest['avg_batch']}, avg write {ingest['avg_write_ms']}ms, dropped {ingest['dropped']}")
+
+
+async def bench_local(total: int):
+    os.environ["REPORTS_DB"] = os.path.join(tempfile.mkdtemp(), "bench_reports.sqlite3")
+    from services import report_store
+
+    store = report_store.store
+    store.start()
+    submit_ms = []
+    start = time.perf_counter()
+    for i in range(total):
+        now = time.time()
+        report = {**make_report(), "id": uuid.uuid4().hex, "reported_at": now, "received_at": now}
+        t = time.perf_counter()
+        try:
+            store.submit(report)
+        except report_store.IngestQueueFull:
+            # Let the writer catch up, as a shedding client would after a 503
+            await asyncio.sleep(0.01)
+        submit_ms.append((time.perf_counter() - t) * 1000)
+        if i % 500 == 0:
+            await asyncio.sleep(0)
+    await store.stop()
+    elapsed = time.perf_counter() - start
+
+    stats = store.stats()
+    print(f"Wrote {stats['written']} reports in {elapsed:.2f}s ({stats['written'] / elapsed:.0f}/s)")
+    print(f"submit() us: p50 {percentile(submit_ms, 0.5) * 1000:.1f}  p99 {percentile(submit_ms, 0.99) * 1000:.1f}")
+    print(f"Writer: {stats['batches']} batches, avg {stats['avg_batch']}, avg write {stats['avg_write_ms']}ms, "
+          f"rejected {stats['rejected']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--reports", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--local", action="store_true", help="benchmark the writer in-process, without HTTP")
+    args = parser.parse_args()
+
+    if args.local:
+        asyncio.run(bench_local(args.reports))
+    else:
+        asyncio.run(bench_http(args.url, args.reports, args.concurrency))
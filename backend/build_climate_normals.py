@@ -0,0 +1,142 @@
+"""
+Offline batch ingester for the climate normals store (services/climate_normals.py).
+
+Downloads daily mean temperature and precipitation from the Open-Meteo archive
+for every cell of a lat/lon grid, then writes memory-mappable NumPy arrays.
+
+Usage (defaults cover Karnataka at 0.25°):
+    python build_climate_normals.py --lat-min 11.5 --lat-max 18.5 --lon-min 74.0 --lon-max 78.75 --step 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+from services import http_client
+from services.climate_normals import CLIMATE_NORMALS_DIR, day_of_year_index, week_index
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+
+async def fetch_cell(sem, lat, lon, first_year, last_year, retries=3):
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": f"{first_year}-01-01",
+        "end_date": f"{last_year}-12-31",
+        "daily": "temperature_2m_mean,precipitation_sum",
+        "timezone": "auto",
+    }
+    async with sem:
+        for attempt in range(retries):
+            try:
+                response = await http_client.get_client().get(ARCHIVE_URL, params=params, timeout=120)
+                response.raise_for_status()
+                return response.json()["daily"]
+            except Exception as e:
+                print(f"  ({lat}, {lon}) attempt {attempt + 1} failed: {e}")
+                await asyncio.sleep(2 ** attempt * 5)
+    return None
+
+
+def reduce_cell(daily, first_year, n_years, baseline):
+    """
+    Collapse one cell's daily series into per-day-of-year normals and per-year weekly means.
+    """
+    normals_sum = np.zeros((366, 2), dtype=np.float64)
+    normals_count = np.zeros((366, 2), dtype=np.int32)
+    weekly_sum = np.zeros((n_years, 53), dtype=np.float64)
+    weekly_count = np.zeros((n_years, 53), dtype=np.int32)
+
+    for day, temp, precip in zip(daily["time"], daily["temperature_2m_mean"], daily["precipitation_sum"]):
+        d = date.fromisoformat(day)
+        doy = day_of_year_index(d)
+        if baseline[0] <= d.year <= baseline[1]:
+            if temp is not None:
+                normals_sum[doy, 0] += temp
+                normals_count[doy, 0] += 1
+            if precip is not None:
+                normals_sum[doy, 1] += precip
+                normals_count[doy, 1] += 1
+        if temp is not None:
+            w = week_index(d)
+            weekly_sum[d.year - first_year, w] += temp
+            weekly_count[d.year - first_year, w] += 1
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normals = (normals_sum / normals_count).astype(np.float32)
+        weekly = (weekly_sum / weekly_count).astype(np.float16)
+    return normals, weekly
+
+
+async def build(args):
+    lats = np.round(np.arange(args.lat_min, args.lat_max + args.step / 2, args.step), 4)
+    lons = np.round(np.arange(args.lon_min, args.lon_max + args.step / 2, args.step), 4)
+    n_years = args.last_year - args.first_year + 1
+    baseline = (args.baseline_start, args.baseline_end)
+
+    os.makedirs(args.out, exist_ok=True)
+    meta_path = os.path.join(args.out, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    normals = np.lib.format.open_memmap(
+        os.path.join(args.out, "normals.npy"), mode="w+", dtype=np.float32, shape=(len(lats), len(lons), 366, 2)
+    )
+    weekly = np.lib.format.open_memmap(
+        os.path.join(args.out, "weekly.npy"), mode="w+", dtype=np.float16, shape=(len(lats), len(lons), n_years, 53)
+    )
+    normals[:] = np.nan
+    weekly[:] = np.nan
+
+    await http_client.startup()
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def ingest(i, j):
+        daily = await fetch_cell(sem, float(lats[i]), float(lons[j]), args.first_year, args.last_year)
+        if daily is None:
+            return
+        normals[i, j], weekly[i, j] = reduce_cell(daily, args.first_year, n_years, baseline)
+
+    cells = [(i, j) for i in range(len(lats)) for j in range(len(lons))]
+    print(f"Ingesting {len(cells)} cells, {args.first_year}-{args.last_year}")
+    for start in range(0, len(cells), 50):
+        await asyncio.gather(*(ingest(i, j) for i, j in cells[start:start + 50]))
+        print(f"  {min(start + 50, len(cells))}/{len(cells)} cells")
+    await http_client.shutdown()
+
+    normals.flush()
+    weekly.flush()
+    meta = {
+        "lat0": float(lats[0]),
+        "lon0": float(lons[0]),
+        "step": args.step,
+        "n_lat": len(lats),
+        "n_lon": len(lons),
+        "first_year": args.first_year,
+        "baseline": list(baseline),
+        "built": date.today().isoformat(),
+    }
+    # meta.json is written last: its presence marks a complete store
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"Climate normals written to {args.out}")
+
+
+if __name__ == "__main__":
+    last_full_year = (date.today() - timedelta(days=365)).year
+    parser = argparse.ArgumentParser(description="Build the climate normals store")
+    parser.add_argument("--lat-min", type=float, default=11.5)
+    parser.add_argument("--lat-max", type=float, default=18.5)
+    parser.add_argument("--lon-min", type=float, default=74.0)
+    parser.add_argument("--lon-max", type=float, default=78.75)
+    parser.add_argument("--step", type=float, default=0.25)
+    parser.add_argument("--first-year", type=int, default=1980)
+    parser.add_argument("--last-year", type=int, default=last_full_year)
+    parser.add_argument("--baseline-start", type=int, default=1991)
+    parser.add_argument("--baseline-end", type=int, default=2020)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--out", default=CLIMATE_NORMALS_DIR)
+    asyncio.run(build(parser.parse_args()))
@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -7,10 +9,39 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+from services import climate_normals, detection_engines, http_client, image_prep, llm, prompt_builder, report_aggregates, report_alerts, report_store, semantic_cache, sessions, singleflight
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared resources live for the whole process, not per request
+    await http_client.startup()
+    climate_normals.load()
+    schemes.catalogue.load()
+    schemes.catalogue.start_watcher()
+    market.catalogue.load()
+    market.catalogue.start_watcher()
+    advisor.start_warmer()
+    await asyncio.to_thread(report_aggregates.aggregates.rebuild, report_store.store)
+    await asyncio.to_thread(report_aggregates.cells.rebuild, report_store.store)
+    report_store.store.on_batch(report_aggregates.aggregates.add_batch)
+    report_store.store.on_batch(report_aggregates.cells.add_batch)
+    report_store.store.on_batch(report_alerts.monitor.on_batch)
+    report_store.store.start()
+    yield
+    await report_store.store.stop()
+    await advisor.stop_warmer()
+    await schemes.catalogue.stop_watcher()
+    await market.catalogue.stop_watcher()
+    await http_client.shutdown()
+    detection_engines.local_engine.shutdown()
+
+
 app = FastAPI(
     title="Agriculture Doctor API",
     description="Backend API for Agriculture Doctor Platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -48,5 +79,30 @@ app.include_router(advisor.router)
 def read_root():
     return {"message": "Welcome to Agriculture Doctor API"}
 
+@app.get("/metrics")
+def read_metrics():
+    """
+    Internal counters for capacity planning.
+    """
+    return {
+        "http_pool": http_client.stats(),
+        "weather_cache": weather.forecast_cache.stats(),
+        "singleflight": singleflight.stats(),
+        "image_prep": image_prep.stats(),
+        "disease_cache": disease.result_cache.stats(),
+        "disease_engines": detection_engines.stats(),
+        "llm": llm.stats(),
+        "chat_sessions": sessions.store.stats(),
+        "prompt_tokens": prompt_builder.stats(),
+        "advisor_plans": advisor.stats(),
+        "semantic_cache": semantic_cache.cache.stats(),
+        "scheme_index": schemes.stats(),
+        "market_catalogue": market.stats(),
+        "collective_ingest": report_store.store.stats(),
+        "collective_aggregates": {**report_aggregates.aggregates.stats(), **report_aggregates.cells.stats()},
+        "collective_alerts": report_alerts.monitor.stats(),
+        "climate_normals": climate_normals.get_store().stats() if climate_normals.get_store() else None,
+    }
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,84 +1,393 @@
-import os
+import asyncio
 import json
-import google.generativeai as genai
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional, List, Dict
-from dotenv import load_dotenv
-
-load_dotenv()
+import os
+import re
+from collections import Counter
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError, create_model
+from typing import Optional, List, Dict, Literal
+from services import llm, singleflight
+from services.cache import TTLCache
+from services.json_stream import IncrementalJSONParser
+from services.singleflight import make_key
+from services.snapshot import sse
 
 router = APIRouter(prefix="/api/advisor", tags=["advisor"])
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_DOCTOR_KEY")
-if not api_key:
-    print("WARNING: GEMINI_DOCTOR_KEY not found")
-else:
-    genai.configure(api_key=api_key)
-
-model = genai.GenerativeModel('gemini-2.5-flash')
+model = llm.get_model('gemini-2.5-flash')
 
 SYSTEM_PROMPT = """You are Agriculture Doctor's Farming Practice Advisor. 
 A farmer wants to learn about a new farming practice.
 
-Your job is to return a strict JSON implementation plan.
-
-JSON Schema:
-{
-  "practice_name": "String",
-  "one_liner": "String",
-  "why_it_works": "String",
-  "compatibility": "High" | "Medium" | "Low",
-  "compatibility_reason": "String",
-  "estimated_cost": { "min": Number, "max": Number, "unit": "String" },
-  "time_to_see_results": "String",
-  "phases": [
-    {
-      "phase": Number,
-      "title": "String",
-      "duration": "String",
-      "steps": ["String"],
-      "cost_this_phase": "String",
-      "what_you_need": ["String"]
-    }
-  ],
-  "common_mistakes": ["String"],
-  "government_schemes": ["String"],
-  "youtube_search": "String"
-}
+Your job is to return a JSON implementation plan.
 
 Rules:
 1. Use simple English suitable for Indian farmers.
 2. Costs must be in INR (₹).
 3. Mention real Indian government schemes (PM-KISAN, etc).
-4. Do not include markdown formatting (```json), just raw JSON.
 """
 
+
+class EstimatedCost(BaseModel):
+    min: float
+    max: float
+    unit: str
+
+
+class Phase(BaseModel):
+    phase: int
+    title: str
+    duration: str
+    steps: List[str]
+    cost_this_phase: str
+    what_you_need: List[str]
+
+
+class PracticePlan(BaseModel):
+    practice_name: str
+    one_liner: str
+    why_it_works: str
+    compatibility: Literal["High", "Medium", "Low"]
+    compatibility_reason: str
+    estimated_cost: EstimatedCost
+    time_to_see_results: str
+    phases: List[Phase]
+    common_mistakes: List[str]
+    government_schemes: List[str]
+    youtube_search: str
+
+
+# Gemini is constrained to the response model, so output is JSON of the right shape
+PLAN_CONFIG = {"response_mime_type": "application/json", "response_schema": llm.response_schema(PracticePlan)}
+PHASE_CONFIG = {"response_mime_type": "application/json", "response_schema": llm.response_schema(Phase)}
+_FIELD_ADAPTERS = {name: TypeAdapter(field.annotation) for name, field in PracticePlan.model_fields.items()}
+
+# Plans depend only on the practice and a coarse view of the farmer, so they
+# are cached per (practice, region, land size band, crop). When enabled, the
+# buckets farmers actually ask for most are regenerated in the background
+# before they expire. Off by default so dev servers (and every --reload) make
+# no Gemini calls of their own.
+ADVISOR_PLAN_TTL = float(os.getenv("ADVISOR_PLAN_TTL", str(7 * 24 * 3600)))
+ADVISOR_WARMER_ENABLED = os.getenv("ADVISOR_WARMER_ENABLED", "false").lower() == "true"
+ADVISOR_WARM_INTERVAL = float(os.getenv("ADVISOR_WARM_INTERVAL", str(6 * 3600)))
+# How many of the most requested (practice, profile) buckets the warmer keeps fresh
+ADVISOR_WARM_TOP_N = int(os.getenv("ADVISOR_WARM_TOP_N", "50"))
+# One-off requests are not worth a background regeneration
+ADVISOR_WARM_MIN_REQUESTS = int(os.getenv("ADVISOR_WARM_MIN_REQUESTS", "2"))
+# Distinct keys whose request counts are tracked; rarely asked ones are dropped beyond this
+ADVISOR_DEMAND_MAX_KEYS = int(os.getenv("ADVISOR_DEMAND_MAX_KEYS", "5000"))
+
+plan_cache = TTLCache(
+    "advisor_plans",
+    ttl=ADVISOR_PLAN_TTL,
+    max_bytes=int(os.getenv("ADVISOR_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+)
+
+# Spelling variants farmers type for the same practice
+PRACTICE_ALIASES = {
+    "drip": "drip irrigation",
+    "drip irrigation system": "drip irrigation",
+    "vermicompost": "vermicomposting",
+    "vermi compost": "vermicomposting",
+    "mulch": "mulching",
+    "sri": "sri rice method",
+    "system of rice intensification": "sri rice method",
+    "hydroponic": "hydroponics",
+    "organic": "organic farming",
+}
+
+# Operational holding classes from the Agriculture Census, converted to acres
+LAND_BANDS = [(2.5, "marginal (under 2.5 acres)"), (5, "small (2.5-5 acres)"), (10, "semi-medium (5-10 acres)"),
+              (25, "medium (10-25 acres)"), (float("inf"), "large (over 25 acres)")]
+_HECTARE_RE = re.compile(r"hect|\bha\b")
+
+_demand: Counter = Counter()
+_warm_stats = {"runs": 0, "warmed": 0, "errors": 0}
+_repair_stats = {"phase_repairs": 0, "remainder_requests": 0}
+_warmer_task: Optional[asyncio.Task] = None
+
+
+def normalize_practice(name: str) -> str:
+    name = re.sub(r"[^\w\s]", " ", name.lower())
+    name = " ".join(name.split())
+    return PRACTICE_ALIASES.get(name, name)
+
+
+def _land_band(value) -> str:
+    if value in (None, ""):
+        return "unknown"
+    text = str(value).lower()
+    match = re.search(r"\d+(\.\d+)?", text)
+    if not match:
+        return "unknown"
+    acres = float(match.group())
+    if _HECTARE_RE.search(text):
+        acres *= 2.47
+    return next(label for limit, label in LAND_BANDS if acres < limit)
+
+
+def bucket_profile(profile: Optional[Dict]) -> tuple:
+    """
+    Reduce a farmer profile to (region, land band, crop). Other fields are
+    not used for generation, so every profile in a bucket gets the same plan.
+    """
+    profile = profile or {}
+    region = profile.get("state") or profile.get("region") or ""
+    land = profile.get("acreage") or profile.get("land_size") or profile.get("land")
+    crop = profile.get("crop_type") or profile.get("crop") or ""
+    return (" ".join(str(region).split()).title() or "Any", _land_band(land), str(crop).strip().lower() or "any")
+
+
+def _build_prompt(practice: str, bucket: tuple) -> str:
+    region, land, crop = bucket
+    profile_text = f"state: {region}, land size: {land}, crop_type: {crop}"
+    return f"{SYSTEM_PROMPT}\n\nFarmer Profile: {profile_text}\nPractice: {practice}\n\nReturn JSON:"
+
+
+def _decode_field(name: str, raw: str):
+    adapter = _FIELD_ADAPTERS[name]
+    try:
+        return adapter.dump_python(adapter.validate_json(raw), mode="json")
+    except ValidationError:
+        return None
+
+
+async def _repair_phase(prompt: str, index: int, phases: Dict[int, dict]) -> dict:
+    """
+    Re-request a single phase that came back malformed.
+    """
+    _repair_stats["phase_repairs"] += 1
+    done = "; ".join(f"{p['phase']}. {p['title']}" for _, p in sorted(phases.items()))
+    text = await model.generate(
+        f"{prompt}\n\nThe plan's other phases are: {done or 'not written yet'}.\n"
+        f"Write only phase {index + 1} of the plan as JSON.",
+        generation_config=PHASE_CONFIG,
+    )
+    try:
+        return Phase.model_validate_json(text).model_dump()
+    except ValidationError:
+        raise llm.LLMError(502, f"AI returned an invalid plan phase {index + 1}")
+
+
+async def _request_remainder(prompt: str, fields: dict, phases: List[dict], missing: List[str], phases_open: bool) -> dict:
+    """
+    Ask only for the parts of the plan that are missing or invalid, passing
+    the finished parts as context, instead of regenerating the whole plan.
+    """
+    _repair_stats["remainder_requests"] += 1
+    wanted = list(missing) + (["phases"] if phases_open else [])
+    remainder = create_model(
+        "PlanRemainder", **{name: (PracticePlan.model_fields[name].annotation, ...) for name in wanted}
+    )
+    partial = json.dumps({**fields, "phases": phases}, ensure_ascii=False)
+    note = f" For phases, return only the phases after phase {len(phases)}." if phases_open and phases else ""
+    text = await model.generate(
+        f"{prompt}\n\nPart of the plan is already written:\n{partial}\n\n"
+        f"Return JSON with only these remaining fields: {', '.join(wanted)}.{note}",
+        generation_config={"response_mime_type": "application/json", "response_schema": llm.response_schema(remainder)},
+    )
+    try:
+        return remainder.model_validate_json(text).model_dump()
+    except ValidationError:
+        raise llm.LLMError(502, "AI returned an invalid plan")
+
+
+async def _plan_events(practice: str, bucket: tuple):
+    """
+    Stream the plan from Gemini, yielding ("field", {...}) and ("phase", {...})
+    as each part completes and a final ("done", plan). Malformed phases are
+    re-requested one by one; if the stream breaks off, only the missing fields
+    (and phases) are requested.
+    """
+    prompt = _build_prompt(practice, bucket)
+    parser = IncrementalJSONParser(("phases",))
+    fields: Dict[str, object] = {}
+    phases: Dict[int, dict] = {}
+    bad_phases: List[int] = []
+    phases_closed = False
+
+    try:
+        async for text in model.stream(prompt, generation_config=PLAN_CONFIG):
+            for event in parser.feed(text):
+                if event[0] == "item":
+                    _, _, index, raw = event
+                    try:
+                        phases[index] = Phase.model_validate_json(raw).model_dump()
+                    except ValidationError:
+                        bad_phases.append(index)
+                        continue
+                    yield "phase", {"index": index, "phase": phases[index]}
+                    continue
+                _, name, raw = event
+                if name == "phases":
+                    phases_closed = True
+                elif name in _FIELD_ADAPTERS:
+                    value = _decode_field(name, raw)
+                    if value is not None:
+                        fields[name] = value
+                        yield "field", {"name": name, "value": value}
+    except llm.LLMError as e:
+        # Nothing to salvage: let the caller report the upstream error
+        if not fields and not phases:
+            raise
+        print(f"Advisor Stream Error: {e}")
+
+    for index in bad_phases:
+        phases[index] = await _repair_phase(prompt, index, phases)
+        yield "phase", {"index": index, "phase": phases[index], "repaired": True}
+
+    missing = [name for name in _FIELD_ADAPTERS if name != "phases" and name not in fields]
+    if missing or not phases_closed:
+        ordered = [phases[i] for i in sorted(phases)]
+        remainder = await _request_remainder(prompt, fields, ordered, missing, not phases_closed)
+        for index, phase in enumerate(remainder.pop("phases", []), start=len(phases)):
+            phases[index] = phase
+            yield "phase", {"index": index, "phase": phase, "repaired": True}
+        for name, value in remainder.items():
+            fields[name] = value
+            yield "field", {"name": name, "value": value}
+
+    plan = PracticePlan.model_validate({**fields, "phases": [phases[i] for i in sorted(phases)]}).model_dump()
+    plan_cache.set((practice, bucket), plan)
+    yield "done", plan
+
+
+async def _get_plan(practice: str, bucket: tuple) -> dict:
+    """
+    Generate and cache the plan for one (practice, bucket) key; concurrent
+    requests for the same key share one Gemini call.
+    """
+    async def run():
+        async for kind, data in _plan_events(practice, bucket):
+            if kind == "done":
+                return data
+
+    return await singleflight.gemini.do(make_key("advisor", practice, *bucket), run)
+
+
+async def _warm_once():
+    # Only buckets real requests produced; seeded guesses never match a client's profile
+    keys = [key for key, count in _demand.most_common(ADVISOR_WARM_TOP_N) if count >= ADVISOR_WARM_MIN_REQUESTS]
+    for practice, bucket in keys:
+        # Only regenerate entries that would expire before the next run
+        if plan_cache.expires_in((practice, bucket)) > ADVISOR_WARM_INTERVAL:
+            continue
+        try:
+            await _get_plan(practice, bucket)
+            _warm_stats["warmed"] += 1
+        except Exception as e:
+            _warm_stats["errors"] += 1
+            print(f"Advisor Warmer Error: {e}")
+    _warm_stats["runs"] += 1
+
+
+async def _warm_loop():
+    # Demand is observed per process, so there is nothing to warm at startup
+    while True:
+        await asyncio.sleep(ADVISOR_WARM_INTERVAL)
+        await _warm_once()
+
+
+def start_warmer():
+    global _warmer_task
+    if ADVISOR_WARMER_ENABLED and llm.is_configured() and _warmer_task is None:
+        _warmer_task = asyncio.ensure_future(_warm_loop())
+
+
+async def stop_warmer():
+    global _warmer_task
+    if _warmer_task is not None:
+        _warmer_task.cancel()
+        try:
+            await _warmer_task
+        except asyncio.CancelledError:
+            pass
+        _warmer_task = None
+
+
+def _record_demand(key: tuple):
+    global _demand
+    _demand[key] += 1
+    if len(_demand) > ADVISOR_DEMAND_MAX_KEYS:
+        _demand = Counter(dict(_demand.most_common(ADVISOR_DEMAND_MAX_KEYS // 2)))
+
+
+def stats() -> dict:
+    return {
+        **plan_cache.stats(), **_warm_stats, **_repair_stats,
+        "warmer_enabled": ADVISOR_WARMER_ENABLED, "tracked_keys": len(_demand),
+    }
+
+
 class PlanRequest(BaseModel):
     practice_name: str
     farmer_profile: Optional[Dict] = {}
 
-@router.post("/plan")
-async def generate_plan(request: PlanRequest):
-    if not api_key:
+@router.post("/plan", response_model=PracticePlan)
+async def generate_plan(request: PlanRequest, response: Response):
+    practice = normalize_practice(request.practice_name)
+    bucket = bucket_profile(request.farmer_profile)
+    key = (practice, bucket)
+    _record_demand(key)
+
+    plan = plan_cache.get(key)
+    if plan is not None:
+        response.headers["X-Cache"] = "HIT"
+        return plan
+
+    if not llm.is_configured():
         raise HTTPException(status_code=500, detail="Gemini API Key missing")
 
     try:
-        profile_text = ", ".join([f"{k}: {v}" for k, v in request.farmer_profile.items() if v])
-        prompt = f"{SYSTEM_PROMPT}\n\nFarmer Profile: {profile_text}\nPractice: {request.practice_name}\n\nReturn JSON:"
-
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        
-        # Clean markdown if present
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.endswith("```"):
-            text = text[:-3]
-            
-        return json.loads(text)
+        plan = await _get_plan(practice, bucket)
+        response.headers["X-Cache"] = "MISS"
+        return plan
 
+    except llm.LLMError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         print(f"Advisor Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/plan/stream")
+async def generate_plan_stream(request: PlanRequest):
+    """
+    Same plan as /plan, streamed as Server-Sent Events: `field` events for
+    top-level fields, a `phase` event as each phase is finished (or repaired),
+    then `done` with the full plan.
+    """
+    practice = normalize_practice(request.practice_name)
+    bucket = bucket_profile(request.farmer_profile)
+    key = (practice, bucket)
+    _record_demand(key)
+
+    cached = plan_cache.get(key)
+    if cached is None and not llm.is_configured():
+        raise HTTPException(status_code=500, detail="Gemini API Key missing")
+
+    async def events():
+        try:
+            if cached is not None:
+                for name, value in cached.items():
+                    if name != "phases":
+                        yield sse("field", {"name": name, "value": value})
+                for index, phase in enumerate(cached["phases"]):
+                    yield sse("phase", {"index": index, "phase": phase})
+                yield sse("done", {**cached, "cached": True})
+                return
+
+            async for kind, data in _plan_events(practice, bucket):
+                yield sse(kind, data)
+        except llm.LLMError as e:
+            yield sse("error", {"detail": e.detail})
+        except Exception as e:
+            print(f"Advisor Stream Error: {e}")
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,115 +1,156 @@
+import asyncio
+import os
 from fastapi import APIRouter, HTTPException, Query
-import httpx
+from services import climate_normals, http_client, singleflight
+from services.singleflight import make_key
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 
 router = APIRouter(
     prefix="/api/climate",
     tags=["climate"]
 )
 
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+DEFAULT_YEARS = [1990, 2023]
+MAX_YEARS = 20
+
+# Caps how many archive queries a single request may have in flight
+CLIMATE_FETCH_CONCURRENCY = int(os.getenv("CLIMATE_FETCH_CONCURRENCY", "8"))
+
+
+async def _archive_get(url: str, params: dict) -> dict:
+    """
+    GET an archive window, sharing the upstream call with concurrent identical queries.
+    """
+    async def fetch():
+        response = await http_client.get_client().get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    return await singleflight.open_meteo.do(make_key(url, params), fetch)
+
+
+def _insights_from_store(store, lat: float, lon: float, today: datetime):
+    """
+    Answer from the precomputed normals store; no network on this path.
+    """
+    found = store.insights(lat, lon, today.date())
+    if found is None:
+        return None
+
+    by_year = found["week_by_year"]
+    past_year = 1990 if 1990 in by_year else min(by_year)
+    latest_year = max(by_year)
+    temp_past = by_year[past_year]
+    temp_latest = by_year[latest_year]
+    anomaly = found["anomaly"]
+
+    insight = f"Temperatures in your region have {'risen' if temp_latest > temp_past else 'fallen'} by {abs(round(temp_latest - temp_past, 1))}°C since {past_year}."
+    if found["trend_per_decade"] is not None:
+        insight += f" This week has been warming by {found['trend_per_decade']}°C per decade,"
+        insight += f" and the last {climate_normals.RECENT_YEARS} years ran {abs(anomaly)}°C {'above' if anomaly >= 0 else 'below'} the {store.baseline[0]}-{store.baseline[1]} normal."
+
+    return {
+        "comparison": {
+            "past": temp_past,
+            "latest": temp_latest,
+            "diff": round(temp_latest - temp_past, 1),
+            "past_year": past_year,
+            "latest_year": latest_year
+        },
+        "normals": {
+            "period": f"{store.baseline[0]}-{store.baseline[1]}",
+            "temperature": found["normal_temperature"],
+            "precipitation": found["normal_precipitation"]
+        },
+        "anomaly": anomaly,
+        "trend_per_decade": found["trend_per_decade"],
+        "insight": insight,
+        "source": "normals"
+    }
+
+async def _week_mean(sem: asyncio.Semaphore, lat: float, lon: float, year: int, today: datetime) -> float:
+    """
+    Mean daily temperature for the week starting on today's date in `year`.
+    """
+    async with sem:
+        # Feb 29 doesn't exist in most years; use the 28th instead
+        start = today.replace(year=year, day=min(today.day, 28)) if today.month == 2 else today.replace(year=year)
+        data = await _archive_get(ARCHIVE_URL, {
+            "latitude": lat,
+            "longitude": lon,
+            "start_date": start.strftime("%Y-%m-%d"),
+            "end_date": (start + timedelta(days=6)).strftime("%Y-%m-%d"), # 1 week average
+            "daily": "temperature_2m_mean",
+            "timezone": "auto"
+        })
+    temps = [t for t in data["daily"]["temperature_2m_mean"] if t is not None]
+    return sum(temps) / len(temps)
+
+
+async def _fetch_year_windows(lat: float, lon: float, years: List[int], today: datetime) -> Dict[int, float]:
+    """
+    Fan out one archive query per year concurrently (bounded by CLIMATE_FETCH_CONCURRENCY),
+    so total latency is roughly one round-trip. Years that fail are left out.
+    """
+    sem = asyncio.Semaphore(CLIMATE_FETCH_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_week_mean(sem, lat, lon, year, today) for year in years),
+        return_exceptions=True
+    )
+    by_year = {}
+    for year, result in zip(years, results):
+        if isinstance(result, Exception):
+            print(f"Climate API Error ({year}): {result}")
+        else:
+            by_year[year] = round(result, 1)
+    return by_year
+
+
 @router.get("")
 async def get_climate_insights(
     lat: float = Query(..., description="Latitude"),
-    lon: float = Query(..., description="Longitude")
+    lon: float = Query(..., description="Longitude"),
+    years: Optional[List[int]] = Query(None, description="Years to compare this week against, e.g. every decade since 1980")
 ):
     """
     Fetch historical climate data and compare with current weather to generate insights.
-    Uses Open-Meteo Climate/Archive API.
+    Uses the precomputed normals store when available, otherwise the Open-Meteo Archive API.
     """
+    today = datetime.now()
+    store = climate_normals.get_store()
+    if store is not None and not years:
+        result = _insights_from_store(store, lat, lon, today)
+        if result is not None:
+            return result
+
+    # The archive lags real time by about a week, so the last complete year is the latest comparison
+    latest_archive_year = (today - timedelta(days=14)).year - 1
+    years = sorted({y for y in (years or DEFAULT_YEARS) if 1940 <= y <= latest_archive_year})[:MAX_YEARS]
+
     try:
-        # Calculate date range for historical average (last 30 years same month)
-        today = datetime.now()
-        start_date = (today - timedelta(days=365 * 30)).strftime("%Y-%m-%d")
-        end_date = (today - timedelta(days=365)).strftime("%Y-%m-%d")
-        
-        # We'll use the archive API to get long term data
-        # For simplicity in this demo, we compare "today in history" averages
-        # In a real app, we might want pre-calculated climate normals
-        
-        url = "https://archive-api.open-meteo.com/v1/archive"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "start_date": start_date,
-            "end_date": end_date,
-            "daily": "temperature_2m_mean,precipitation_sum",
-            "timezone": "auto"
+        by_year = await _fetch_year_windows(lat, lon, years, today)
+        if len(by_year) < 2:
+            raise ValueError("Not enough archive data to compare")
+
+        past_year, latest_year = min(by_year), max(by_year)
+        temp_past, temp_latest = by_year[past_year], by_year[latest_year]
+
+        return {
+            "comparison": {
+                "past": temp_past,
+                "latest": temp_latest,
+                "diff": round(temp_latest - temp_past, 1),
+                "past_year": past_year,
+                "latest_year": latest_year
+            },
+            "by_year": by_year,
+            "insight": f"Temperatures in your region have {'risen' if temp_latest > temp_past else 'fallen'} by {abs(round(temp_latest - temp_past, 1))}°C since {past_year}.",
+            "source": "archive"
         }
-        
-        # Optimization: To avoid processing 30 years of daily data on the fly for every request,
-        # we can just fetch the last year vs 30 years ago to show a trend, 
-        # or rely on the simpler 'climate' models if available.
-        # For now, let's fetch a simplified view: 
-        # Compare "This month last year" vs "This month 20 years ago" 
-        
-        # Let's adjust to a more lightweight approach for the hackathon/demo:
-        # Fetch data for this specific week from 1990, 2000, 2010, 2020.
-        
-        years = [1990, 2000, 2010, 2020]
-        historical_data = []
-        
-        async with httpx.AsyncClient() as client:
-             # This is a bit heavy, strictly for demo purposes we might mock or use a very specific efficient query
-             # Open-Meteo is fast, but multiple requests might be slow.
-             # Alternative: Use the daily aggregate for a long range but just take the mean.
-             
-             # Better approach for efficient API usage:
-             # Fetch the last 10 years of data for this month to show recent warming trend.
-             
-             query_start_date = (today - timedelta(days=365 * 10)).strftime("%Y-%m-%d")
-             query_end_date = today.strftime("%Y-%m-%d")
-             
-             # NOTE: archive API usually goes up to 2 weeks ago. 
-             # We will use the 'climate' API if possible, but archive is standard.
-             
-             # Let's fallback to a simpler "Climate Normals" mock calculation if the API is too heavy,
-             # but let's try to get real data for at least one comparison.
-             # We will fetch Today's date in 1990 VS Today's date in 2023.
-             
-             date_1990 = today.replace(year=1990).strftime("%Y-%m-%d")
-             date_2023 = today.replace(year=2023).strftime("%Y-%m-%d")
-             
-             resp_1990 = await client.get(url, params={
-                "latitude": lat,
-                "longitude": lon,
-                "start_date": date_1990,
-                "end_date": (today.replace(year=1990) + timedelta(days=6)).strftime("%Y-%m-%d"), # 1 week average
-                "daily": "temperature_2m_mean",
-                "timezone": "auto"
-             })
-             
-             resp_2023 = await client.get(url, params={
-                "latitude": lat,
-                "longitude": lon,
-                "start_date": date_2023,
-                "end_date": (today.replace(year=2023) + timedelta(days=6)).strftime("%Y-%m-%d"), # 1 week average
-                "daily": "temperature_2m_mean",
-                "timezone": "auto"
-             })
-             
-             data_1990 = resp_1990.json()
-             data_2023 = resp_2023.json()
-             
-             temp_1990 = sum(data_1990["daily"]["temperature_2m_mean"]) / len(data_1990["daily"]["temperature_2m_mean"])
-             temp_2023 = sum(data_2023["daily"]["temperature_2m_mean"]) / len(data_2023["daily"]["temperature_2m_mean"])
-             
-             return {
-                 "comparison": {
-                     "year_1990": round(temp_1990, 1),
-                     "year_2023": round(temp_2023, 1),
-                     "diff": round(temp_2023 - temp_1990, 1)
-                 },
-                 "insight": f"Temperatures in your region have {'risen' if temp_2023 > temp_1990 else 'fallen'} by {abs(round(temp_2023 - temp_1990, 1))}°C since 1990."
-             }
 
     except Exception as e:
-        # Fallback for demo if API fails (avoid breaking frontend)
+        # No fabricated fallback: the client hides the card when insights are unavailable
         print(f"Climate API Error: {e}")
-        return {
-             "comparison": {
-                 "year_1990": 24.5,
-                 "year_2023": 26.2,
-                 "diff": 1.7
-             },
-             "insight": "Temperatures have risen by 1.7°C since 1990 (Simulated Data due to API error)"
-        }
+        raise HTTPException(status_code=503, detail="Climate history is unavailable right now")
@@ -1,16 +1,141 @@
-from fastapi import APIRouter
+import asyncio
+import time
+import uuid
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from services import alert_hub, geohash, report_aggregates, report_alerts, report_store
+from services.snapshot import sse
 
 router = APIRouter(prefix="/api/collective", tags=["collective"])
 
+# Reports older than this are not accepted (they would skew current insights)
+REPORT_MAX_AGE = 30 * 24 * 3600
+# Comment lines keep idle SSE connections open through proxies
+ALERT_HEARTBEAT = 15
+
+
+class Report(BaseModel):
+    issue: str = Field(..., min_length=1, max_length=80)
+    district: str = Field(..., min_length=1, max_length=80)
+    crop: Optional[str] = Field(None, max_length=40)
+    severity: Literal["low", "medium", "high"] = "medium"
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
+    description: Optional[str] = Field(None, max_length=500)
+    # Unix seconds; defaults to the time the report is received
+    reported_at: Optional[float] = None
+
+
+def _clean(text: Optional[str]) -> Optional[str]:
+    # "  leaf  rust" and "Leaf Rust" are the same issue
+    return " ".join(text.split()).title() if text else text
+
+
 @router.get("/insights")
-async def get_insights(district: str):
-    # Logic to get aggregated data
-    return [
-        {"issue": "Aphids", "count": 15, "risk": "High"},
-        {"issue": "Rust", "count": 8, "risk": "Medium"}
-    ]
-
-@router.post("/report")
-async def report_issue(issue: dict):
-    # Logic to save report
-    return {"status": "Reported"}
+async def get_insights(
+    district: Optional[str] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=50),
+    days: int = Query(7, ge=1, le=30)
+):
+    """
+    Issues near (lat, lon) within radius_km over the last `days` days, or
+    issues in a district over the last 30 days; highest risk first.
+    Risk compares the last 24h with the area's baseline.
+    """
+    if lat is not None and lon is not None:
+        return report_aggregates.cells.nearby(lat, lon, radius_km, days)
+    if district:
+        return report_aggregates.aggregates.district_insights(_clean(district))
+    raise HTTPException(status_code=422, detail="Provide lat and lon, or district")
+
+
+@router.post("/report", status_code=202)
+async def report_issue(report: Report):
+    now = time.time()
+    reported_at = min(report.reported_at or now, now)
+    if reported_at < now - REPORT_MAX_AGE:
+        raise HTTPException(status_code=422, detail="Report is too old")
+
+    cell = None
+    if report.lat is not None and report.lon is not None:
+        cell = geohash.encode(report.lat, report.lon, report_store.CELL_PRECISION)
+
+    record = {
+        **report.model_dump(),
+        "id": uuid.uuid4().hex,
+        "issue": _clean(report.issue),
+        "district": _clean(report.district),
+        "crop": _clean(report.crop),
+        "cell": cell,
+        "reported_at": reported_at,
+        "received_at": now,
+    }
+    try:
+        report_store.store.submit(record)
+    except report_store.IngestQueueFull:
+        raise HTTPException(status_code=503, detail="Too many reports right now, please retry", headers={"Retry-After": "5"})
+    return {"status": "Reported", "id": record["id"]}
+
+
+@router.get("/alerts/stream")
+async def alert_stream(
+    request: Request,
+    district: Optional[str] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180)
+):
+    """
+    Server-Sent Events for a district and/or the area around (lat, lon).
+    Starts with a `snapshot` event of current insights, then sends an `alert`
+    event whenever an issue's risk rises to the alert threshold.
+    """
+    topics = []
+    if district:
+        district = _clean(district)
+        topics.append(report_alerts.district_topic(district))
+    if lat is not None and lon is not None:
+        topics += [
+            report_alerts.cell_topic(cell)
+            for cell, _ in geohash.cover(lat, lon, report_alerts.ALERT_RADIUS_KM, report_alerts.ALERT_CELL_PRECISION)
+        ]
+    if not topics:
+        raise HTTPException(status_code=422, detail="Provide lat and lon, or district")
+
+    try:
+        sub = alert_hub.hub.subscribe(topics)
+    except alert_hub.HubFull:
+        raise HTTPException(status_code=503, detail="Too many alert subscribers", headers={"Retry-After": "30"})
+
+    async def events():
+        try:
+            snapshot = {}
+            if district:
+                snapshot["district"] = report_aggregates.aggregates.district_insights(district)
+            if lat is not None and lon is not None:
+                snapshot["nearby"] = report_aggregates.cells.nearby(lat, lon, report_alerts.ALERT_RADIUS_KM, 7)
+            yield f"retry: 10000\n{sse('snapshot', snapshot)}"
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(sub.get(), timeout=ALERT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if message is alert_hub.CLOSED:
+                    # Too far behind; the client reconnects and gets a fresh snapshot
+                    break
+                yield sse("alert", message)
+        finally:
+            alert_hub.hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,72 +1,208 @@
 import os
-import base64
-import requests
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from dotenv import load_dotenv
-
-load_dotenv()
+import asyncio
+import hashlib
+from typing import Dict, List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from services import detection_engines, image_prep, plant_id, singleflight
+from services.disk_cache import DiskCache
+from services.singleflight import make_key
 
 router = APIRouter(prefix="/api/disease", tags=["disease"])
 
-PLANT_ID_API_KEY = os.getenv("PLANT_ID_API_KEY")
-PLANT_ID_URL = "https://api.plant.id/v2/health_assessment"
+# Diagnoses keyed by image content; a photo re-sent after a timeout or shared
+# in a WhatsApp group is answered without another paid Plant.id call.
+result_cache = DiskCache(
+    os.getenv("DISEASE_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "disease_cache.sqlite3")),
+    ttl=float(os.getenv("DISEASE_CACHE_TTL", str(30 * 24 * 3600))),
+    max_bytes=int(os.getenv("DISEASE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    max_distance=int(os.getenv("DISEASE_CACHE_PHASH_DISTANCE", "3")),
+)
+
+DISEASE_BATCH_MAX_IMAGES = int(os.getenv("DISEASE_BATCH_MAX_IMAGES", "20"))
+
+detector = detection_engines.detector
+
+
+def _require_engine():
+    if not detector.is_available():
+        raise HTTPException(status_code=500, detail="Server misconfigured: Missing Plant.id API Key and no local disease model")
+
+
+def _public(result: dict) -> dict:
+    """
+    Fields we return to clients and keep in the result cache.
+    """
+    return {k: result[k] for k in ("disease", "confidence", "treatment", "prevention", "engine") if k in result}
+
+
+async def _detect_one(contents: bytes) -> dict:
+    """
+    Diagnose a single plant photo: cache lookups, preprocessing, then Plant.id.
+    """
+    key = hashlib.sha256(contents).hexdigest()
+
+    cached = await result_cache.get_async(key, count_miss=False)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    # Downscale and recompress off the event loop before uploading
+    try:
+        prepared = await image_prep.prepare_async(contents)
+    except image_prep.InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Re-encoded or resized copies of a known photo match on perceptual hash
+    cached = await result_cache.get_similar_async(prepared["phash"])
+    if cached is not None:
+        await result_cache.set_async(key, cached, prepared["phash"])
+        return {**cached, "cached": True, "preprocessing": prepared["report"]}
+
+    _require_engine()
+
+    # Identical uploads arriving together (group retries, shared photos) are diagnosed once
+    result = await singleflight.plant_id.do(key, lambda: detector.detect([prepared["data"]]))
+
+    summary = _public(result)
+    # A local guess made while Plant.id was unreachable shouldn't stick; let the next try escalate
+    if not result.get("uncertain"):
+        await result_cache.set_async(key, summary, prepared["phash"])
+
+    response = {**summary, "cached": False, "preprocessing": prepared["report"]}
+    if result.get("uncertain"):
+        response["uncertain"] = True
+    if result.get("raw"):
+        response["raw_data"] = result["raw"] # Include raw for debugging
+    return response
+
+
+def _merge_results(results: List[dict], weights: List[int]) -> dict:
+    """
+    Combine several diagnoses of the same plant, weighting each candidate's
+    probability by how many images its assessment covered.
+    """
+    total = sum(weights)
+    scores: Dict[str, float] = {}
+    for result, weight in zip(results, weights):
+        for c in result["candidates"]:
+            scores[c["name"]] = scores.get(c["name"], 0.0) + c["probability"] * weight / total
+    name, score = max(scores.items(), key=lambda kv: kv[1])
+    treatment = next((r["treatment"] for r in results if r["disease"] == name), "Consult an expert.")
+    return {"disease": name, "confidence": round(score, 2), "treatment": treatment}
+
+
+async def _detect_plant(contents_list: List[bytes]) -> dict:
+    """
+    All images show one plant: pack them into as few Plant.id assessments as allowed.
+    """
+    try:
+        prepared = await asyncio.gather(*(image_prep.prepare_async(c) for c in contents_list))
+    except image_prep.InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    _require_engine()
+
+    size = plant_id.PLANT_ID_MAX_IMAGES_PER_CALL
+    chunks = [prepared[i:i + size] for i in range(0, len(prepared), size)]
+
+    async def assess(chunk):
+        data = [p["data"] for p in chunk]
+        key = make_key("plant", [hashlib.sha256(d).hexdigest() for d in data])
+        return await singleflight.plant_id.do(key, lambda: detector.detect(data))
+
+    results = await asyncio.gather(*(assess(chunk) for chunk in chunks))
+
+    images = []
+    for chunk_index, (chunk, result) in enumerate(zip(chunks, results)):
+        for p in chunk:
+            images.append({**_public(result), "assessment": chunk_index, "preprocessing": p["report"]})
+
+    return {
+        "mode": "plant",
+        "upstream_calls": sum(1 for r in results if r.get("engine") == "plant_id"),
+        "images": images,
+        "aggregate": _merge_results(results, [len(c) for c in chunks])
+    }
+
+
+async def _detect_survey(contents_list: List[bytes]) -> dict:
+    """
+    Each image is a different plant. Plant.id scores all images of a request as
+    one plant, so these go out as parallel single-image calls (bounded by the
+    Plant.id client's concurrency cap) and each can be served from cache.
+    """
+    async def detect(contents):
+        try:
+            return await _detect_one(contents)
+        except HTTPException as e:
+            return {"error": e.detail, "status_code": e.status_code}
+        except plant_id.PlantIdError as e:
+            return {"error": e.detail, "status_code": e.status_code}
+        except Exception as e:
+            # One bad image or malformed upstream reply must not fail the whole survey
+            print(f"Survey Image Error: {e}")
+            return {"error": str(e), "status_code": 500}
+
+    images = await asyncio.gather(*(detect(c) for c in contents_list))
+
+    diagnosed = [i for i in images if "error" not in i]
+    counts: Dict[str, int] = {}
+    for i in diagnosed:
+        counts[i["disease"]] = counts.get(i["disease"], 0) + 1
+    healthy = counts.get("Healthy", 0)
+
+    return {
+        "mode": "survey",
+        "upstream_calls": sum(1 for i in diagnosed if not i.get("cached")),
+        "images": images,
+        "aggregate": {
+            "diagnosed": len(diagnosed),
+            "failed": len(images) - len(diagnosed),
+            "healthy_share": round(healthy / len(diagnosed), 2) if diagnosed else None,
+            "diseases": [
+                {"disease": name, "count": n}
+                for name, n in sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+                if name != "Healthy"
+            ]
+        }
+    }
+
 
 @router.post("/detect")
 async def detect_disease(file: UploadFile = File(...)):
-    if not PLANT_ID_API_KEY:
-        raise HTTPException(status_code=500, detail="Server misconfigured: Missing Plant.id API Key")
-
     try:
         # Read file content
         contents = await file.read()
-        encoded_image = base64.b64encode(contents).decode("utf-8")
+        return await _detect_one(contents)
 
-        headers = {
-            "Content-Type": "application/json",
-            "Api-Key": PLANT_ID_API_KEY,
-        }
+    except HTTPException:
+        raise
+    except plant_id.PlantIdError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        print(f"Detection Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        data = {
-            "images": [encoded_image],
-            "modifiers": ["similar_images"],
-            "disease_details": ["description", "treatment", "cause"],
-        }
 
-        response = requests.post(PLANT_ID_URL, json=data, headers=headers)
-        
-        if response.status_code != 200:
-            print(f"Plant.id Error: {response.text}")
-            raise HTTPException(status_code=response.status_code, detail="Failed to analyze image with Plant.id")
-
-        result = response.json()
-        
-        # Extract most likely disease
-        if not result.get("health_assessment", {}).get("diseases"):
-             return {
-                "disease": "Healthy",
-                "confidence": 0.99,
-                "treatment": "Keep up the good work!",
-                "prevention": []
-            }
-            
-        top_match = result["health_assessment"]["diseases"][0]
-        
-        disease_name = top_match.get("name", "Unknown Issue")
-        confidence = top_match.get("probability", 0)
-        
-        # Extract treatment info if available
-        details = top_match.get("disease_details", {})
-        treatment_desc = details.get("treatment", {}).get("biological", []) + details.get("treatment", {}).get("chemical", [])
-        
-        treatment_str = " ".join(treatment_desc[:2]) if treatment_desc else "Consult an expert."
-
-        return {
-            "disease": disease_name,
-            "confidence": round(confidence, 2),
-            "treatment": treatment_str,
-            "raw_data": top_match # Include raw for debugging
-        }
+@router.post("/detect/batch")
+async def detect_disease_batch(
+    files: List[UploadFile] = File(...),
+    mode: str = Form("plant", description="'plant': several photos of one plant; 'survey': one photo per plant across a field")
+):
+    if mode not in ("plant", "survey"):
+        raise HTTPException(status_code=400, detail="mode must be 'plant' or 'survey'")
+    if len(files) > DISEASE_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {DISEASE_BATCH_MAX_IMAGES} images per batch")
 
+    try:
+        contents_list = [await f.read() for f in files]
+        if mode == "plant":
+            return await _detect_plant(contents_list)
+        return await _detect_survey(contents_list)
+
+    except HTTPException:
+        raise
+    except plant_id.PlantIdError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
-        print(f"Detection Error: {e}")
+        print(f"Batch Detection Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,23 +1,20 @@
-import os
-import google.generativeai as genai
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import time
+import base64
+import asyncio
+import hashlib
+import binascii
+from fastapi import APIRouter, HTTPException, Path
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from dotenv import load_dotenv
-
-load_dotenv()
+from services import image_prep, llm, prompt_builder, semantic_cache, sessions
+from services.singleflight import make_key
+from services.snapshot import sse
 
 router = APIRouter(prefix="/api/doctor", tags=["doctor"])
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_DOCTOR_KEY")
-if not api_key:
-    print("WARNING: GEMINI_DOCTOR_KEY not found in environment variables")
-else:
-    genai.configure(api_key=api_key)
-
-# Initialize Model
-model = genai.GenerativeModel('gemini-2.5-flash')
+# Shared, event-loop-safe Gemini client
+model = llm.get_model('gemini-2.5-flash')
 
 SYSTEM_PROMPT = """You are an expert Agricultural Doctor AI chatbot assisting Indian farmers.
 You diagnose crop diseases, suggest treatments, and provide farming advice.
@@ -29,55 +26,257 @@ If a farmer describes symptoms, provide:
 If you need more information (like a photo or more details), ask for it politely.
 Always prioritize practical, actionable advice."""
 
+# Server-issued ids are uuid4 hex; allow a little slack for other clients
+SESSION_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
 
 class DiagnoseRequest(BaseModel):
     message: str
+    session_id: Optional[str] = Field(None, max_length=64, pattern=SESSION_ID_PATTERN)
     crop_type: Optional[str] = None
     location: Optional[str] = None
     image_url: Optional[str] = None
     image_base64: Optional[str] = None
+    # Seeds a new session; also resent after a 409 session_expired. Ignored once the session exists
     chat_history: List[dict] = []
     language: Optional[str] = "en"
     language_name: Optional[str] = "English"
 
 
-@router.post("/diagnose")
-async def diagnose(request: DiagnoseRequest):
-    if not api_key:
-        raise HTTPException(status_code=500, detail="Server misconfigured: Missing Gemini API Key")
+def _build_prefix(request: DiagnoseRequest) -> str:
+    lang_name = request.language_name or "English"
+
+    prefix = SYSTEM_PROMPT
+    prefix += f"\n\nIMPORTANT: You MUST respond ONLY in {lang_name}. Do not use any other language.\n\n"
+
+    if request.crop_type:
+        prefix += f"Crop: {request.crop_type}\n"
+    if request.location:
+        prefix += f"Location: {request.location}\n"
+    return prefix
+
+
+def _session_prefix(session: dict, request: DiagnoseRequest) -> str:
+    """
+    The system prompt and farmer profile only change when language, crop or
+    location do, so each session keeps its rendered prefix.
+    """
+    key = make_key(request.language_name, request.crop_type, request.location)
+    if session.get("prefix_key") != key:
+        session["prefix"] = _build_prefix(request)
+        session["prefix_key"] = key
+    return session["prefix"]
+
+
+def _build_prompt(request: DiagnoseRequest, session: dict, has_image: bool) -> dict:
+    """
+    Returns {"prompt", "usage"}; history is trimmed to the token budget.
+    """
+    extra = ""
+    if request.image_base64:
+        extra += "\n[Note: The farmer has attached a photo of their crop for diagnosis.]\n"
+    elif has_image:
+        extra += "\n[Note: The crop photo the farmer shared earlier in this conversation is attached.]\n"
+
+    return prompt_builder.build(session, _session_prefix(session, request), request.message, extra)
+
+
+def _decode_image(image_base64: str) -> bytes:
+    # The web client sends a data URL ("data:image/jpeg;base64,...")
+    if image_base64.startswith("data:"):
+        image_base64 = image_base64.split(",", 1)[-1]
+    try:
+        return base64.b64decode(image_base64, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="image_base64 is not valid base64")
+
+
+_upload_tasks = set()
+
+
+def _schedule_upload(session: dict, ref: dict, data: bytes, mime_type: str):
+    """
+    Upload the photo to the Gemini File API in the background. This turn
+    already sent it inline; later turns reference the upload by URI.
+    """
+    async def upload():
+        try:
+            uploaded = await llm.upload_image(data, mime_type)
+        except Exception as e:
+            print(f"Gemini Upload Error: {e}")
+            return
+        # The handler's copy picks this up if it has not been saved yet
+        ref.update(uploaded)
+
+        # Otherwise patch only the image field of the stored session, and only
+        # if it still holds this photo; turns and summaries are left alone
+        def apply(stored: dict) -> bool:
+            image = stored.get("image")
+            if not image or image.get("sha") != ref["sha"]:
+                return False
+            image.update(uploaded)
+            return True
+
+        try:
+            await sessions.store.update(session["id"], apply)
+        except Exception as e:
+            print(f"Session Update Error: {e}")
+
+    task = asyncio.ensure_future(upload())
+    _upload_tasks.add(task)
+    task.add_done_callback(_upload_tasks.discard)
+
 
+async def _load_session(request: DiagnoseRequest) -> dict:
     try:
-        lang_name = request.language_name or "English"
+        return await sessions.store.get_or_create(request.session_id, request.chat_history)
+    except sessions.SessionExpired as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-        full_context_prompt = SYSTEM_PROMPT
-        full_context_prompt += f"\n\nIMPORTANT: You MUST respond ONLY in {lang_name}. Do not use any other language.\n\n"
 
-        if request.crop_type:
-            full_context_prompt += f"Crop: {request.crop_type}\n"
-        if request.location:
-            full_context_prompt += f"Location: {request.location}\n"
+async def _image_parts(request: DiagnoseRequest, session: dict) -> List:
+    """
+    Image parts to send with the prompt. A new photo is downscaled off the
+    event loop and sent inline; the session's photo is re-sent by File API URI.
+    """
+    ref = session.get("image")
+    ref_usable = bool(ref and ref.get("uri") and ref.get("expires_at", 0) > time.time())
 
-        if request.image_base64:
-            full_context_prompt += "\n[Note: The farmer has attached a photo of their crop for diagnosis.]\n"
+    if not request.image_base64:
+        return [llm.file_part(ref)] if ref_usable else []
 
-        full_context_prompt += "\nChat History:\n"
-        for msg in request.chat_history:
-            role = "Farmer" if msg.get("role") == "user" else "AI Doctor"
-            full_context_prompt += f"{role}: {msg.get('content', '')}\n"
+    raw = _decode_image(request.image_base64)
+    sha = hashlib.sha256(raw).hexdigest()
+    if ref_usable and ref["sha"] == sha:
+        # Same photo re-sent by the client: no re-encode, no re-upload
+        return [llm.file_part(ref)]
 
-        full_context_prompt += f"\nFarmer: {request.message}\nAI Doctor:"
+    try:
+        prepared = await image_prep.prepare_async(raw)
+    except image_prep.InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    ref = {"sha": sha, "mime_type": prepared["mime_type"]}
+    session["image"] = ref
+    _schedule_upload(session, ref, prepared["data"], prepared["mime_type"])
+    return [{"mime_type": prepared["mime_type"], "data": prepared["data"]}]
+
+
+def _is_first_question(request: DiagnoseRequest, session: dict) -> bool:
+    """
+    Only context-free questions can be answered from the semantic cache:
+    no photo and no earlier farmer turns in the conversation.
+    """
+    if request.image_base64 or request.image_url or session.get("image"):
+        return False
+    return not any(m.get("role") == "user" for m in session["history"])
+
+
+def _result(reply: str, session: dict, usage: dict) -> dict:
+    return {
+        "diagnosis": reply,
+        "confidence": "High",
+        "treatment": [],
+        "prevention": [],
+        "session_id": session["id"],
+        "usage": usage
+    }
+
+
+@router.post("/diagnose")
+async def diagnose(request: DiagnoseRequest):
+    if not llm.is_configured():
+        raise HTTPException(status_code=500, detail="Server misconfigured: Missing Gemini API Key")
+
+    try:
+        session = await _load_session(request)
+        images = await _image_parts(request, session)
+        built = _build_prompt(request, session, bool(images))
+        full_context_prompt = built["prompt"]
+        contents = [full_context_prompt] + images
+        dedupe_key = make_key("doctor", full_context_prompt, session.get("image", {}).get("sha"))
+
+        cacheable = _is_first_question(request, session)
+        if cacheable:
+            hit = semantic_cache.cache.lookup(request.message, request.crop_type, request.language, request.location)
+            if hit is not None:
+                await sessions.store.append_turn(session, request.message, hit["answer"])
+                return {**_result(hit["answer"], session, built["usage"]), "cached": True, "similarity": hit["similarity"]}
 
-        # Generate response
-        response = model.generate_content(full_context_prompt)
-        reply = response.text
+        # Generate response; identical concurrent prompts share one Gemini call
+        start = time.perf_counter()
+        reply = await model.generate(contents, dedupe_key=dedupe_key)
+        if cacheable:
+            semantic_cache.cache.store(
+                request.message, request.crop_type, request.language, reply, (time.perf_counter() - start) * 1000,
+                request.location
+            )
 
-        return {
-            "diagnosis": reply,
-            "confidence": "High",
-            "treatment": [],
-            "prevention": []
-        }
+        await sessions.store.append_turn(session, request.message, reply)
+        return _result(reply, session, built["usage"])
 
+    except HTTPException:
+        raise
+    except llm.LLMError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         print(f"Gemini Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/diagnose/stream")
+async def diagnose_stream(request: DiagnoseRequest):
+    """
+    Same as /diagnose, but streams the answer as Server-Sent Events:
+    `token` events carry text chunks as Gemini produces them, and a final
+    `done` event carries the structured fields of the /diagnose response.
+    """
+    if not llm.is_configured():
+        raise HTTPException(status_code=500, detail="Server misconfigured: Missing Gemini API Key")
+
+    session = await _load_session(request)
+    images = await _image_parts(request, session)
+    built = _build_prompt(request, session, bool(images))
+    full_context_prompt = built["prompt"]
+    contents = [full_context_prompt] + images
+
+    cacheable = _is_first_question(request, session)
+
+    async def events():
+        parts = []
+        try:
+            hit = semantic_cache.cache.lookup(request.message, request.crop_type, request.language, request.location) if cacheable else None
+            if hit is not None:
+                yield sse("token", {"text": hit["answer"]})
+                await sessions.store.append_turn(session, request.message, hit["answer"])
+                yield sse("done", {**_result(hit["answer"], session, built["usage"]), "cached": True, "similarity": hit["similarity"]})
+                return
+
+            start = time.perf_counter()
+            async for text in model.stream(contents):
+                parts.append(text)
+                yield sse("token", {"text": text})
+            reply = "".join(parts)
+            if cacheable:
+                semantic_cache.cache.store(
+                    request.message, request.crop_type, request.language, reply, (time.perf_counter() - start) * 1000,
+                    request.location
+                )
+            await sessions.store.append_turn(session, request.message, reply)
+            yield sse("done", _result(reply, session, built["usage"]))
+        except Exception as e:
+            print(f"Gemini Stream Error: {e}")
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Stop proxies (nginx, Render) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete("/session/{session_id}")
+async def end_session(session_id: str = Path(..., max_length=64, pattern=SESSION_ID_PATTERN)):
+    await sessions.store.delete(session_id)
+    return {"status": "Deleted"}
@@ -1,13 +1,268 @@
-from fastapi import APIRouter
+import base64
+import binascii
+import json
+import os
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional, Tuple
+from services.cache import TTLCache
+from services.snapshot import Snapshot, etag, not_modified, respond, serialize
 
 router = APIRouter(prefix="/api/market", tags=["market"])
 
+
+class Product(BaseModel):
+    id: int
+    name: str
+    category: str
+    price: float = Field(..., ge=0)
+    unit: str = ""
+    brand: str = ""
+    in_stock: bool = True
+
+
+MARKET_PRODUCTS_PATH = os.getenv(
+    "MARKET_PRODUCTS_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "products.json")
+)
+# How often the catalogue file is checked for price/stock changes
+MARKET_RELOAD_INTERVAL = float(os.getenv("MARKET_RELOAD_INTERVAL", "5"))
+MARKET_MAX_AGE = int(os.getenv("MARKET_MAX_AGE", "60"))
+MARKET_PAGE_SIZE = 20
+MARKET_MAX_PAGE_SIZE = 100
+
+SortOrder = Literal["name", "price_asc", "price_desc", "newest"]
+SORT_ORDERS = ("name", "price_asc", "price_desc", "newest")
+
+# Sort key per order; the id tie-break makes every key unique, which the cursor relies on
+_SORT_KEYS = {
+    "name": lambda p: (p["name"].casefold(), p["id"]),
+    "price_asc": lambda p: (p["price"], p["id"]),
+    "price_desc": lambda p: (-p["price"], p["id"]),
+    "newest": lambda p: (-p["id"], p["id"]),
+}
+
+page_cache = TTLCache(
+    "market_pages",
+    ttl=float(os.getenv("MARKET_PAGE_TTL", "600")),
+    max_bytes=int(os.getenv("MARKET_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+)
+
+
+class Ordering:
+    """
+    Product positions in one sort order, with their sort keys alongside for bisect.
+    """
+
+    __slots__ = ("positions", "keys")
+
+    def __init__(self, positions: List[int], keys: List[tuple]):
+        self.positions = positions
+        self.keys = keys
+
+
+class CatalogueSnapshot:
+    """
+    Immutable in-memory catalogue. Every (category, in-stock) view is kept
+    pre-sorted in each sort order, and each product is serialized once, so a
+    page is a bisect plus a join of ready-made bytes.
+    """
+
+    def __init__(self, products: List[dict], version: tuple):
+        self.products = products
+        self.version = version
+        self.fragments = [serialize(p) for p in products]
+        self.categories = sorted({p["category"] for p in products})
+        self._category_keys = {c.casefold(): c for c in self.categories}
+
+        # rank[sort][pos]: a product's place in the full catalogue for that order
+        self.rank: Dict[str, List[int]] = {}
+        full = {}
+        for sort in SORT_ORDERS:
+            key = _SORT_KEYS[sort]
+            positions = sorted(range(len(products)), key=lambda i: key(products[i]))
+            ranks = [0] * len(products)
+            for r, i in enumerate(positions):
+                ranks[i] = r
+            self.rank[sort] = ranks
+            full[sort] = positions
+
+        # (category, in_stock_only, sort) -> Ordering; "" is every category
+        self.orderings: Dict[Tuple[str, bool, str], Ordering] = {}
+        for sort, positions in full.items():
+            key = _SORT_KEYS[sort]
+            views = {
+                (category, in_stock): Ordering([], [])
+                for category in [""] + self.categories for in_stock in (False, True)
+            }
+            # One pass per order; each product lands in the views it belongs to, still sorted
+            for i in positions:
+                product = products[i]
+                k = key(product)
+                targets = [("", False), (product["category"], False)]
+                if product["in_stock"]:
+                    targets += [("", True), (product["category"], True)]
+                for target in targets:
+                    views[target].positions.append(i)
+                    views[target].keys.append(k)
+            for (category, in_stock), view in views.items():
+                self.orderings[(category, in_stock, sort)] = view
+
+        body = serialize([
+            {
+                "category": c,
+                "count": len(self.orderings[(c, False, "name")].positions),
+                "in_stock": len(self.orderings[(c, True, "name")].positions),
+            }
+            for c in self.categories
+        ])
+        self.categories_body = (body, etag(body))
+
+    def category(self, name: Optional[str]) -> Optional[str]:
+        """
+        Canonical category for a filter value ("" for all, None if unknown).
+        """
+        if not name or name == "All":
+            return ""
+        return self._category_keys.get(name.strip().casefold())
+
+
+def _build(data: list, version: tuple) -> CatalogueSnapshot:
+    return CatalogueSnapshot([Product(**item).model_dump() for item in data], version)
+
+
+def _on_load(current: CatalogueSnapshot):
+    # Filtered views and pages of the previous catalogue are never served again
+    _filtered.cache_clear()
+    page_cache.clear()
+
+
+catalogue = Snapshot("Market Catalogue", MARKET_PRODUCTS_PATH, _build, MARKET_RELOAD_INTERVAL, on_load=_on_load)
+
+
+@lru_cache(maxsize=256)
+def _filtered(
+    current: CatalogueSnapshot, category: str, in_stock: bool,
+    min_price: Optional[float], max_price: Optional[float], sort: str
+) -> Ordering:
+    """
+    The ordering for a filter. Without a price range it is precomputed; with
+    one, the matching slice is cut from the price-sorted view by bisect and,
+    for other sort orders, re-sorted by catalogue rank.
+    """
+    ordering = current.orderings[(category, in_stock, sort)]
+    if min_price is None and max_price is None:
+        return ordering
+
+    by_price = current.orderings[(category, in_stock, "price_asc")]
+    lo = bisect_left(by_price.keys, (min_price,)) if min_price is not None else 0
+    hi = bisect_right(by_price.keys, (max_price, float("inf"))) if max_price is not None else len(by_price.keys)
+    if sort == "price_asc":
+        return Ordering(by_price.positions[lo:hi], by_price.keys[lo:hi])
+    positions = sorted(by_price.positions[lo:hi], key=current.rank[sort].__getitem__)
+    key = _SORT_KEYS[sort]
+    return Ordering(positions, [key(current.products[i]) for i in positions])
+
+
+def _encode_cursor(sort: str, key: tuple) -> str:
+    raw = serialize([sort, list(key)])
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, key = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort or not isinstance(key, list) or len(key) != 2:
+        raise HTTPException(status_code=400, detail="Cursor does not match this sort order")
+    return tuple(key)
+
+
+def _page(
+    current: CatalogueSnapshot, category: str, in_stock: bool, min_price: Optional[float],
+    max_price: Optional[float], sort: str, cursor: Optional[str], limit: int
+) -> bytes:
+    ordering = _filtered(current, category, in_stock, min_price, max_price, sort)
+    start = 0
+    if cursor:
+        # Keyset: resume after the last key served, so pages stay stable across reloads
+        try:
+            start = bisect_right(ordering.keys, _decode_cursor(cursor, sort))
+        except TypeError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    end = min(start + limit, len(ordering.positions))
+    next_cursor = _encode_cursor(sort, ordering.keys[end - 1]) if end < len(ordering.positions) else None
+    return b"".join([
+        b'{"items":[',
+        b",".join(current.fragments[i] for i in ordering.positions[start:end]),
+        b'],"next_cursor":',
+        serialize(next_cursor),
+        b',"total":',
+        str(len(ordering.positions)).encode("ascii"),
+        b"}",
+    ])
+
+
+def stats() -> dict:
+    current = catalogue.get()
+    return {
+        **page_cache.stats(),
+        **catalogue.stats(),
+        "products": len(current.products),
+        "categories": len(current.categories),
+        "filtered_views": _filtered.cache_info().currsize,
+    }
+
+
+def _respond(request: Request, body: bytes, tag: str):
+    return respond(request, body, tag, max_age=MARKET_MAX_AGE)
+
+
 @router.get("/products")
-async def get_products(category: str = None):
-    # Logic to get products
-    return [
-        {"id": 1, "name": "Urea", "price": 300, "category": "Fertilizers"}
-    ]
+async def get_products(
+    request: Request,
+    category: Optional[str] = Query(None, description="Filter by category (e.g., 'Fertilizers')"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = Query(False, description="Only products currently available"),
+    sort: SortOrder = "name",
+    cursor: Optional[str] = Query(None, max_length=512, description="next_cursor from the previous page"),
+    limit: int = Query(MARKET_PAGE_SIZE, ge=1, le=MARKET_MAX_PAGE_SIZE)
+):
+    """
+    Browse the input catalogue one page at a time. Follow `next_cursor`
+    until it is null; `total` counts every product matching the filters.
+    """
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=422, detail="min_price is greater than max_price")
+    current = catalogue.get()
+    resolved = current.category(category)
+    if resolved is None:
+        body = b'{"items":[],"next_cursor":null,"total":0}'
+        return _respond(request, body, etag(body))
+
+    key = (current.version, resolved, in_stock, min_price, max_price, sort, cursor, limit)
+    # A page is fully determined by the snapshot and the query, so its ETag is too
+    tag = etag(repr(key).encode("utf-8"))
+    if not_modified(request, tag):
+        return _respond(request, b"", tag)
+    body = page_cache.get(key)
+    if body is None:
+        body = _page(current, resolved, in_stock, min_price, max_price, sort, cursor, limit)
+        page_cache.set(key, body)
+    return _respond(request, body, tag)
+
+
+@router.get("/categories")
+async def get_categories(request: Request):
+    """
+    Categories with total and in-stock product counts.
+    """
+    return _respond(request, *catalogue.get().categories_body)
+
 
 @router.post("/orders")
 async def create_order(order: dict):
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Query, HTTPException
-from typing import List, Optional
+import os
+import time
+from fastapi import APIRouter, Query, HTTPException, Request
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from services.search_index import SearchIndex
+from services.snapshot import Snapshot, etag, respond, serialize
 
 router = APIRouter(
     prefix="/api/schemes",
@@ -21,135 +25,109 @@ class Scheme(BaseModel):
     is_new: bool = False
     is_updated: bool = False
 
-# Mock Database of Schemes
-# In a real application, this might be fetched from a database or external API.
-SCHEMES_DB = [
-    {
-        "id": 1,
-        "name": "PM Kisan Samman Nidhi",
-        "hindi_name": "प्रधानमंत्री किसान सम्मान निधि",
-        "ministry": "Ministry of Agriculture & Farmers Welfare",
-        "description": "Income support of ₹6,000 per year in three equal installments to all land-holding farmer families.",
-        "benefits": ["₹6000 per year per family", "Direct Bank Transfer", "No intermediaries"],
-        "category": "Financial Assistance",
-        "link": "https://pmkisan.gov.in",
-        "last_updated": "2025-02-15",
-        "is_updated": True
-    },
-    {
-        "id": 2,
-        "name": "Pradhan Mantri Fasal Bima Yojana (PMFBY)",
-        "hindi_name": "प्रधानमंत्री फसल बीमा योजना",
-        "ministry": "Ministry of Agriculture & Farmers Welfare",
-        "description": "Comprehensive crop insurance scheme to provide financial support to farmers suffering crop loss/damage arising out of unforeseen events.",
-        "benefits": ["Low premium rates", "Full sum insured coverage", "Post-harvest loss coverage"],
-        "category": "Crop Insurance",
-        "link": "https://pmfby.gov.in",
-        "last_updated": "2025-01-20",
-        "is_new": False
-    },
-    {
-        "id": 3,
-        "name": "Soil Health Card Scheme",
-        "hindi_name": "मृदा स्वास्थ्य कार्ड योजना",
-        "ministry": "Ministry of Agriculture & Farmers Welfare",
-        "description": "Government issues soil health cards to farmers which carries crop-wise recommendations of nutrients and fertilizers required for the individual farms.",
-        "benefits": ["Soil testing every 3 years", "Fertilizer recommendations", "Improved Productivity"],
-        "category": "Soil Health",
-        "link": "https://soilhealth.dac.gov.in",
-        "last_updated": "2024-12-10",
-        "is_new": False
-    },
-    {
-        "id": 4,
-        "name": "Kisan Credit Card (KCC)",
-        "hindi_name": "किसान क्रेडिट कार्ड",
-        "ministry": "Ministry of Finance / NABARD",
-        "description": "Provides adequate and timely credit support from the banking system under a single window with flexible and simplified procedure.",
-        "benefits": ["Credit for cultivation", "Post-harvest expenses", "Working capital for maintenance"],
-        "category": "Credit & Loan",
-        "link": "https://www.nabard.org/content1.aspx?id=1720&catid=23&mid=23",
-        "last_updated": "2025-02-01",
-        "is_updated": True
-    },
-    {
-        "id": 5,
-        "name": "e-NAM (National Agriculture Market)",
-        "hindi_name": "राष्ट्रीय कृषि बाजार",
-        "ministry": "Ministry of Agriculture & Farmers Welfare",
-        "description": "Pan-India electronic trading portal which networks the existing APMC mandis to create a unified national market for agricultural commodities.",
-        "benefits": ["Better price discovery", "Transparent auction process", "Real-time payments"],
-        "category": "Market Support",
-        "link": "https://enam.gov.in",
-        "last_updated": "2025-02-10",
-        "is_new": False
-    },
-    {
-        "id": 6,
-        "name": "Pradhan Mantri Krishi Sinchayee Yojana (PMKSY)",
-        "hindi_name": "प्रधानमंत्री कृषि सिंचाई योजना",
-        "ministry": "Ministry of Jal Shakti",
-        "description": "Har Khet Ko Pani - focused on expanding cultivated area under assured irrigation, improving on-farm water use efficiency.",
-        "benefits": ["Micro Irrigation support", "Water harvesting structures", "More crop per drop"],
-        "category": "Irrigation",
-        "link": "https://pmksy.gov.in",
-        "last_updated": "2024-11-05",
-        "is_new": False
-    },
-    {
-        "id": 7,
-        "name": "Paramparagat Krishi Vikas Yojana (PKVY)",
-        "hindi_name": "परम्परागत कृषि विकास योजना",
-        "ministry": "Ministry of Agriculture & Farmers Welfare",
-        "description": "Promotes organic farming through adoption of organic village by cluster approach and PGS certification.",
-        "benefits": ["₹50,000 per hectare for 3 years", "Marketing support", "Organic certification assistance"],
-        "category": "Organic Farming",
-        "link": "https://pgsindia-ncof.gov.in/pkvy/index.aspx",
-        "last_updated": "2025-02-18",
-        "is_new": True
-    },
-    {
-        "id": 8,
-        "name": " PM-KUSUM Scheme",
-        "hindi_name": "प्रधानमंत्री कुसुम योजना",
-        "ministry": "Ministry of New and Renewable Energy",
-        "description": "Installation of solar pumps and grid-connected solar power plants for farmers.",
-        "benefits": ["Subsidy on solar pumps", "Income from selling power", "Water security"],
-        "category": "Technology & Energy",
-        "link": "https://pmkusum.mnre.gov.in",
-        "last_updated": "2025-01-15",
-        "is_new": False
-    }
-]
+# Search field weights: names matter most, ministry least
+SCHEME_SEARCH_FIELDS = {
+    "name": 3.0,
+    "hindi_name": 3.0,
+    "category": 1.5,
+    "description": 1.0,
+    "benefits": 1.0,
+    "ministry": 0.5,
+}
+
+SCHEMES_PATH = os.getenv(
+    "SCHEMES_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "schemes.json")
+)
+# How often the catalogue file is checked for changes
+SCHEMES_RELOAD_INTERVAL = float(os.getenv("SCHEMES_RELOAD_INTERVAL", "5"))
+SCHEMES_MAX_AGE = int(os.getenv("SCHEMES_MAX_AGE", "300"))
+
+
+class CatalogueSnapshot:
+    """
+    Immutable view of the catalogue: schemes validated once at load, the
+    search index, and every static response body serialized up front with
+    its ETag.
+    """
+
+    def __init__(self, schemes: List[dict]):
+        self.schemes = schemes
+        self.index = SearchIndex(schemes, SCHEME_SEARCH_FIELDS, facet_field="category")
+        self.categories = sorted({s["category"] for s in schemes})
+        # Static bodies keyed by category ("" is the whole catalogue)
+        self.bodies: Dict[str, tuple] = {}
+        for category in [""] + self.categories:
+            body = serialize([s for s in schemes if not category or s["category"] == category])
+            self.bodies[category] = (body, etag(body))
+        body = serialize(self.categories)
+        self.categories_body = (body, etag(body))
+        self.empty = (b"[]", etag(b"[]"))
+
+
+def _build(data: list, version: tuple) -> CatalogueSnapshot:
+    return CatalogueSnapshot([Scheme(**item).model_dump() for item in data])
+
+
+catalogue = Snapshot("Schemes", SCHEMES_PATH, _build, SCHEMES_RELOAD_INTERVAL)
+
+
+def stats() -> dict:
+    current = catalogue.get()
+    return {**current.index.stats(), **catalogue.stats(), "categories": len(current.categories)}
+
+
+def _respond(request: Request, body: bytes, tag: Optional[str] = None):
+    return respond(request, body, tag, max_age=SCHEMES_MAX_AGE)
+
 
 @router.get("", response_model=List[Scheme])
 async def get_schemes(
+    request: Request,
     category: Optional[str] = Query(None, description="Filter by category (e.g., 'Financial Assistance')"),
     search: Optional[str] = Query(None, description="Search by name or description")
 ):
     """
     Fetch government schemes with optional filtering and searching.
     """
-    results = SCHEMES_DB
-    
-    if category and category != "All":
-        results = [s for s in results if s["category"] == category]
-        
+    current = catalogue.get()
+    facet = category if category and category != "All" else None
+
     if search:
-        search_lower = search.lower()
-        results = [
-            s for s in results 
-            if search_lower in s["name"].lower() 
-            or search_lower in s["hindi_name"].lower()
-            or search_lower in s["description"].lower()
-        ]
-        
-    return results
+        found = current.index.search(search, facet=facet)
+        return _respond(request, serialize([current.schemes[i] for i, _ in found["hits"]]))
+
+    body, tag = current.bodies.get(facet or "", current.empty)
+    return _respond(request, body, tag)
+
+
+@router.get("/search")
+async def search_schemes(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Search text (English, Hindi or Kannada)"),
+    category: Optional[str] = Query(None, description="Restrict results to one category"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Ranked search with per-category counts for the whole result set.
+    """
+    start = time.perf_counter()
+    current = catalogue.get()
+    found = current.index.search(q, facet=category if category and category != "All" else None, limit=limit)
+    # took_ms stays out of the ETag'd body so repeated searches can revalidate
+    body = serialize({
+        "query": q,
+        "total": found["total"],
+        "results": [{**current.schemes[i], "score": round(score, 3)} for i, score in found["hits"]],
+        "facets": found["facets"],
+    })
+    response = _respond(request, body)
+    response.headers["Server-Timing"] = f"search;dur={(time.perf_counter() - start) * 1000:.3f}"
+    return response
+
 
 @router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request):
     """
     Get list of unique scheme categories.
     """
-    categories = set(s["category"] for s in SCHEMES_DB)
-    return sorted(list(categories))
+    return _respond(request, *catalogue.get().categories_body)
@@ -1,11 +1,81 @@
+import os
+import time
 from fastapi import APIRouter, HTTPException, Query
 import httpx
+from services import http_client
+from services import singleflight
+from services.cache import TTLCache
+from services.singleflight import make_key
 
 router = APIRouter(
     prefix="/api/weather",
     tags=["weather"]
 )
 
+# Open-Meteo's best-match models run on ~0.1° grids (ICON-D2/ECMWF IFS 9km),
+# so farmers within the same cell receive identical forecasts.
+WEATHER_GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", "0.1"))
+# "current" conditions are refreshed every 15 minutes upstream
+WEATHER_UPDATE_INTERVAL = int(os.getenv("WEATHER_UPDATE_INTERVAL", "900"))
+
+forecast_cache = TTLCache(
+    "weather",
+    ttl=WEATHER_UPDATE_INTERVAL,
+    max_bytes=int(os.getenv("WEATHER_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+)
+
+
+def snap_to_grid(lat: float, lon: float):
+    """
+    Snap coordinates to the centre of their forecast grid cell.
+    """
+    step = WEATHER_GRID_DEG
+    return round(round(lat / step) * step, 4), round(round(lon / step) * step, 4)
+
+
+def _next_update_boundary() -> float:
+    """
+    Expire entries when the upstream model publishes its next update,
+    rather than a fixed duration after the fetch.
+    """
+    now = time.time()
+    return now - (now % WEATHER_UPDATE_INTERVAL) + WEATHER_UPDATE_INTERVAL
+
+
+async def _fetch_forecast(grid_lat: float, grid_lon: float) -> dict:
+    url = "https://api.open-meteo.com/v1/forecast"
+    params = {
+        "latitude": grid_lat,
+        "longitude": grid_lon,
+        "current": "temperature_2m,relative_humidity_2m,precipitation,weather_code,wind_speed_10m",
+        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum",
+        "timezone": "auto"
+    }
+
+    client = http_client.get_client()
+    response = await client.get(url, params=params)
+    response.raise_for_status()
+    data = response.json()
+
+    result = {
+        "current": {
+            "temperature": data["current"]["temperature_2m"],
+            "humidity": data["current"]["relative_humidity_2m"],
+            "precipitation": data["current"]["precipitation"],
+            "wind_speed": data["current"]["wind_speed_10m"],
+            "weather_code": data["current"]["weather_code"]
+        },
+        "daily": {
+            "max_temp": data["daily"]["temperature_2m_max"][0],
+            "min_temp": data["daily"]["temperature_2m_min"][0],
+            "total_precip" : data["daily"]["precipitation_sum"][0]
+        },
+        "units": data["current_units"]
+    }
+    forecast_cache.set((grid_lat, grid_lon), result, expires_at=_next_update_boundary())
+    return result
+
+
 @router.get("")
 async def get_weather(
     lat: float = Query(..., description="Latitude"),
@@ -14,37 +84,16 @@ async def get_weather(
     """
     Fetch real-time weather data from Open-Meteo API.
     """
+    grid_lat, grid_lon = snap_to_grid(lat, lon)
+    cached = forecast_cache.get((grid_lat, grid_lon))
+    if cached is not None:
+        return cached
+
     try:
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "current": "temperature_2m,relative_humidity_2m,precipitation,weather_code,wind_speed_10m",
-            "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum",
-            "timezone": "auto"
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "current": {
-                    "temperature": data["current"]["temperature_2m"],
-                    "humidity": data["current"]["relative_humidity_2m"],
-                    "precipitation": data["current"]["precipitation"],
-                    "wind_speed": data["current"]["wind_speed_10m"],
-                    "weather_code": data["current"]["weather_code"]
-                },
-                "daily": {
-                    "max_temp": data["daily"]["temperature_2m_max"][0],
-                    "min_temp": data["daily"]["temperature_2m_min"][0],
-                    "total_precip" : data["daily"]["precipitation_sum"][0]
-                },
-                "units": data["current_units"]
-            }
-            
+        # Concurrent cache misses for the same cell share one upstream call
+        key = make_key("forecast", grid_lat, grid_lon)
+        return await singleflight.open_meteo.do(key, lambda: _fetch_forecast(grid_lat, grid_lon))
+
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail="Weather service unavailable")
     except Exception as e:
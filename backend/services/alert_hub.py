@@ -0,0 +1,132 @@
+import asyncio
+import os
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Set
+
+# In-process pub/sub hub for push notifications (SSE).
+#
+# Every subscriber owns a small bounded buffer. publish() never waits: when a
+# subscriber's buffer is full its oldest message is dropped, so one slow client
+# cannot hold up delivery to the rest, and a client that keeps falling behind
+# is disconnected rather than buffered for without limit.
+
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "32"))
+ALERT_MAX_SUBSCRIBERS = int(os.getenv("ALERT_MAX_SUBSCRIBERS", "20000"))
+# Messages a subscriber may lose before it is treated as dead and closed
+ALERT_MAX_DROPPED = int(os.getenv("ALERT_MAX_DROPPED", "100"))
+
+CLOSED = None
+
+
+class HubFull(Exception):
+    pass
+
+
+class Subscription:
+    """
+    Bounded buffer with a single waiter. A deque with maxlen drops the oldest
+    message on overflow, which is cheaper per message than asyncio.Queue when
+    one publish fans out to tens of thousands of subscribers.
+    """
+
+    __slots__ = ("topics", "buffer", "waiter", "dropped", "closed")
+
+    def __init__(self, topics: Set[str], maxsize: int):
+        self.topics = topics
+        self.buffer: deque = deque(maxlen=maxsize)
+        self.waiter: Optional[asyncio.Future] = None
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, message: Optional[dict]) -> bool:
+        """
+        Queue a message; returns True if the oldest one had to be dropped.
+        """
+        overflow = len(self.buffer) == self.buffer.maxlen
+        self.buffer.append(message)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+        return overflow
+
+    async def get(self) -> Optional[dict]:
+        """
+        Next message, or None once the hub has closed this subscription.
+        """
+        while not self.buffer:
+            if self.closed:
+                return CLOSED
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        return self.buffer.popleft()
+
+
+class AlertHub:
+    def __init__(self, queue_size: int, max_subscribers: int, max_dropped: int):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.max_dropped = max_dropped
+        self._topics: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._count = 0
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0, "closed_slow": 0, "rejected": 0}
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        if self._count >= self.max_subscribers:
+            self._stats["rejected"] += 1
+            raise HubFull()
+        sub = Subscription(set(topics), self.queue_size)
+        for topic in sub.topics:
+            self._topics[topic].add(sub)
+        self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        if sub.topics is None:
+            return
+        for topic in sub.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(sub)
+                if not subscribers:
+                    del self._topics[topic]
+        sub.topics = None
+        self._count -= 1
+
+    def _close(self, sub: Subscription):
+        self._stats["closed_slow"] += 1
+        self.unsubscribe(sub)
+        sub.closed = True
+        sub.buffer.clear()
+        if sub.waiter is not None and not sub.waiter.done():
+            sub.waiter.set_result(None)
+
+    def publish(self, topics: List[str], message: dict) -> int:
+        """
+        Deliver `message` once to every subscriber of any of `topics`.
+        Returns the number of subscribers it was queued for.
+        """
+        self._stats["published"] += 1
+        if len(topics) == 1:
+            targets = list(self._topics.get(topics[0], ()))
+        else:
+            targets = set()
+            for topic in topics:
+                targets.update(self._topics.get(topic, ()))
+        dropped = 0
+        for sub in targets:
+            if sub.push(message):
+                dropped += 1
+                sub.dropped += 1
+                if sub.dropped > self.max_dropped:
+                    self._close(sub)
+        self._stats["dropped"] += dropped
+        self._stats["delivered"] += len(targets)
+        return len(targets)
+
+    def stats(self) -> dict:
+        return {**self._stats, "subscribers": self._count, "topics": len(self._topics)}
+
+
+hub = AlertHub(ALERT_QUEUE_SIZE, ALERT_MAX_SUBSCRIBERS, ALERT_MAX_DROPPED)
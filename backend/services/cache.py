@@ -0,0 +1,92 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class TTLCache:
+    """
+    In-memory LRU cache with per-entry expiry and a memory budget.
+
+    Entry size is estimated from the JSON encoding of the value, which is close
+    enough for the dict/list payloads our routers return.
+    """
+
+    def __init__(self, name: str, ttl: float, max_bytes: int = 16 * 1024 * 1024, max_entries: int = 100_000):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return 1024
+
+    def get(self, key) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, size, value = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None):
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (expires_at, size, value)
+        self._bytes += size
+        while self._bytes > self.max_bytes or len(self._data) > self.max_entries:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def expires_in(self, key) -> float:
+        """
+        Seconds until `key` expires (0 if absent). Does not touch LRU order or hit counters.
+        """
+        entry = self._data.get(key)
+        return max(entry[0] - time.time(), 0.0) if entry else 0.0
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,144 @@
+import json
+import os
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+# Precomputed climate normals, built offline by build_climate_normals.py.
+#
+# Layout of CLIMATE_NORMALS_DIR:
+#   meta.json    grid definition and period metadata
+#   normals.npy  float32 [n_lat, n_lon, 366, 2]      baseline daily mean (temperature °C, precipitation mm)
+#   weekly.npy   float16 [n_lat, n_lon, n_years, 53] weekly mean temperature for every year ingested
+#
+# Arrays are memory-mapped, so a lookup touches only the pages for one grid cell.
+
+CLIMATE_NORMALS_DIR = os.getenv(
+    "CLIMATE_NORMALS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "climate_normals"),
+)
+
+TEMPERATURE = 0
+PRECIPITATION = 1
+DAYS_IN_WEEK_WINDOW = 7
+RECENT_YEARS = 10
+
+
+def day_of_year_index(d: date) -> int:
+    """
+    0-based slot in a 366-day year, so Feb 29 has its own slot and
+    March 1 maps to the same slot in leap and non-leap years.
+    """
+    return date(2000, d.month, d.day).timetuple().tm_yday - 1
+
+
+def week_index(d: date) -> int:
+    return min(day_of_year_index(d) // 7, 52)
+
+
+class ClimateNormalsStore:
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.lat0 = self.meta["lat0"]
+        self.lon0 = self.meta["lon0"]
+        self.step = self.meta["step"]
+        self.n_lat = self.meta["n_lat"]
+        self.n_lon = self.meta["n_lon"]
+        self.first_year = self.meta["first_year"]
+        self.baseline = tuple(self.meta["baseline"])
+        self.normals = np.load(os.path.join(directory, "normals.npy"), mmap_mode="r")
+        self.weekly = np.load(os.path.join(directory, "weekly.npy"), mmap_mode="r")
+        self.n_years = self.weekly.shape[2]
+
+    @property
+    def last_year(self) -> int:
+        return self.first_year + self.n_years - 1
+
+    def cell(self, lat: float, lon: float) -> Optional[tuple]:
+        i = int(round((lat - self.lat0) / self.step))
+        j = int(round((lon - self.lon0) / self.step))
+        if 0 <= i < self.n_lat and 0 <= j < self.n_lon:
+            return i, j
+        return None
+
+    def week_mean(self, i: int, j: int, year: int, week: int) -> Optional[float]:
+        y = year - self.first_year
+        if not 0 <= y < self.n_years:
+            return None
+        value = float(self.weekly[i, j, y, week])
+        return None if np.isnan(value) else value
+
+    def insights(self, lat: float, lon: float, on: date) -> Optional[dict]:
+        """
+        Normals, anomaly and warming trend for the week starting at `on`.
+        Returns None when the point lies outside the ingested grid.
+        """
+        cell = self.cell(lat, lon)
+        if cell is None:
+            return None
+        i, j = cell
+
+        doy = day_of_year_index(on)
+        days = [(doy + k) % 366 for k in range(DAYS_IN_WEEK_WINDOW)]
+        window = self.normals[i, j, days, :]
+        normal_temp = float(np.nanmean(window[:, TEMPERATURE]))
+        normal_precip = float(np.nansum(window[:, PRECIPITATION]))
+
+        week = week_index(on)
+        series = np.asarray(self.weekly[i, j, :, week], dtype=np.float32)
+        valid = ~np.isnan(series)
+        if not valid.any():
+            return None
+        years = np.arange(self.first_year, self.first_year + self.n_years)
+
+        recent = series[-RECENT_YEARS:]
+        recent_mean = float(np.nanmean(recent)) if (~np.isnan(recent)).any() else normal_temp
+
+        # Least-squares warming rate for this week of the year, per decade
+        trend = None
+        if valid.sum() >= 2:
+            slope = np.polyfit(years[valid], series[valid], 1)[0]
+            trend = round(float(slope) * 10, 2)
+
+        return {
+            "normal_temperature": round(normal_temp, 1),
+            "normal_precipitation": round(normal_precip, 1),
+            "recent_temperature": round(recent_mean, 1),
+            "anomaly": round(recent_mean - normal_temp, 1),
+            "trend_per_decade": trend,
+            "week_by_year": {int(y): round(float(v), 1) for y, v in zip(years[valid], series[valid])},
+        }
+
+    def stats(self) -> dict:
+        return {
+            "grid": [self.n_lat, self.n_lon],
+            "step": self.step,
+            "years": [self.first_year, self.last_year],
+            "baseline": list(self.baseline),
+        }
+
+
+_store: Optional[ClimateNormalsStore] = None
+
+
+def load(directory: str = CLIMATE_NORMALS_DIR) -> Optional[ClimateNormalsStore]:
+    """
+    Load the store if it has been built; the climate router falls back to live
+    archive queries when it hasn't.
+    """
+    global _store
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        print(f"Climate normals not found in {directory}; using live archive queries")
+        return None
+    try:
+        _store = ClimateNormalsStore(directory)
+    except Exception as e:
+        print(f"Climate normals load error: {e}")
+        _store = None
+    return _store
+
+
+def get_store() -> Optional[ClimateNormalsStore]:
+    return _store
@@ -0,0 +1,209 @@
+import asyncio
+import base64
+import io
+import json
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from services import plant_id
+
+try:
+    import numpy as np
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+# Every engine returns the same shape:
+#   {"disease", "confidence", "treatment", "engine",
+#    "candidates": [{"name", "probability"}, ...], "raw": optional upstream payload}
+
+DISEASE_MODEL_PATH = os.getenv("DISEASE_MODEL_PATH", "")
+# JSON list of {"name", "treatment", "common"}; index i labels output logit i
+DISEASE_MODEL_LABELS = os.getenv("DISEASE_MODEL_LABELS", "")
+DISEASE_MODEL_INPUT_SIZE = int(os.getenv("DISEASE_MODEL_INPUT_SIZE", "224"))
+DISEASE_MODEL_WORKERS = int(os.getenv("DISEASE_MODEL_WORKERS", "2"))
+# Local answers at or above this confidence, for labels marked common, skip Plant.id
+DISEASE_LOCAL_THRESHOLD = float(os.getenv("DISEASE_LOCAL_THRESHOLD", "0.85"))
+
+TOP_K = 5
+
+
+class EngineUnavailable(Exception):
+    pass
+
+
+class DetectionEngine(ABC):
+    name = "base"
+
+    def is_available(self) -> bool:
+        return False
+
+    @abstractmethod
+    async def detect(self, images: List[bytes]) -> dict:
+        """
+        Diagnose one plant from one or more preprocessed images.
+        """
+
+
+class PlantIdEngine(DetectionEngine):
+    name = "plant_id"
+
+    def is_available(self) -> bool:
+        return plant_id.is_configured()
+
+    async def detect(self, images: List[bytes]) -> dict:
+        encoded = [base64.b64encode(data).decode("utf-8") for data in images]
+        result = await plant_id.health_assessment(encoded)
+        diseases = result.get("health_assessment", {}).get("diseases") or []
+        summary = plant_id.summarize(result)
+        candidates = [
+            {"name": d.get("name", "Unknown Issue"), "probability": round(d.get("probability", 0), 3)}
+            for d in diseases[:TOP_K]
+        ] or [{"name": summary["disease"], "probability": summary["confidence"]}]
+        return {
+            **summary,
+            "engine": self.name,
+            "candidates": candidates,
+            "raw": diseases[0] if diseases else None,
+        }
+
+
+# --- Local ONNX classifier ---------------------------------------------------
+# Inference runs in worker processes so a burst of uploads uses every core
+# without holding the GIL on the API process. Each worker loads the model once.
+
+_session = None
+
+
+def _init_worker(model_path: str):
+    global _session
+    options = onnxruntime.SessionOptions()
+    # One thread per process; parallelism comes from the pool
+    options.intra_op_num_threads = 1
+    _session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+
+def _classify(data: bytes, size: int) -> list:
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data)).convert("RGB").resize((size, size), Image.BILINEAR)
+    x = np.asarray(img, dtype=np.float32) / 255.0
+    x = (x - np.array([0.485, 0.456, 0.406], dtype=np.float32)) / np.array([0.229, 0.224, 0.225], dtype=np.float32)
+    x = x.transpose(2, 0, 1)[np.newaxis, ...]
+    input_name = _session.get_inputs()[0].name
+    logits = _session.run(None, {input_name: x})[0][0]
+    exp = np.exp(logits - logits.max())
+    return (exp / exp.sum()).tolist()
+
+
+class LocalClassifierEngine(DetectionEngine):
+    name = "local"
+
+    def __init__(self, model_path: str, labels_path: str):
+        self.model_path = model_path
+        self.labels = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if labels_path and os.path.exists(labels_path):
+            with open(labels_path) as f:
+                self.labels = json.load(f)
+
+    def is_available(self) -> bool:
+        return onnxruntime is not None and bool(self.labels) and os.path.exists(self.model_path)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=DISEASE_MODEL_WORKERS, initializer=_init_worker, initargs=(self.model_path,)
+            )
+        return self._pool
+
+    async def detect(self, images: List[bytes]) -> dict:
+        if not self.is_available():
+            raise EngineUnavailable("Local disease model not installed")
+
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(pool, _classify, data, DISEASE_MODEL_INPUT_SIZE) for data in images)
+        )
+        # Several photos of one plant: average the class probabilities
+        probs = np.mean(np.array(results, dtype=np.float32), axis=0)
+        order = np.argsort(probs)[::-1][:TOP_K]
+        top = self.labels[int(order[0])]
+        return {
+            "disease": top["name"],
+            "confidence": round(float(probs[order[0]]), 2),
+            "treatment": top.get("treatment") or "Consult an expert.",
+            "engine": self.name,
+            "candidates": [
+                {"name": self.labels[int(i)]["name"], "probability": round(float(probs[i]), 3)} for i in order
+            ],
+            "common": bool(top.get("common")),
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+class TieredEngine(DetectionEngine):
+    """
+    Local model first; escalate to Plant.id only when the local answer is
+    uncertain or not one of the common diseases it is trusted on. If Plant.id
+    is down, rate-limited or unconfigured, the local answer is returned flagged.
+    """
+
+    name = "tiered"
+
+    def __init__(self, local: DetectionEngine, remote: DetectionEngine, threshold: float):
+        self.local = local
+        self.remote = remote
+        self.threshold = threshold
+        self.stats = {"local": 0, "escalated": 0, "remote_failed": 0}
+
+    def is_available(self) -> bool:
+        return self.local.is_available() or self.remote.is_available()
+
+    async def detect(self, images: List[bytes]) -> dict:
+        local_result = None
+        if self.local.is_available():
+            try:
+                local_result = await self.local.detect(images)
+            except Exception as e:
+                print(f"Local Classifier Error: {e}")
+            if local_result and local_result["common"] and local_result["confidence"] >= self.threshold:
+                self.stats["local"] += 1
+                return local_result
+
+        if not self.remote.is_available():
+            if local_result is None:
+                raise plant_id.PlantIdError(500, "Server misconfigured: Missing Plant.id API Key")
+            self.stats["remote_failed"] += 1
+            return {**local_result, "uncertain": True}
+
+        self.stats["escalated"] += 1
+        try:
+            return await self.remote.detect(images)
+        except Exception as e:
+            # Transport errors, bad upstream JSON and API errors all fall back alike
+            if local_result is None:
+                raise
+            print(f"Plant.id Fallback Error: {e}")
+            self.stats["remote_failed"] += 1
+            return {**local_result, "uncertain": True}
+
+
+local_engine = LocalClassifierEngine(DISEASE_MODEL_PATH, DISEASE_MODEL_LABELS)
+plant_id_engine = PlantIdEngine()
+detector = TieredEngine(local_engine, plant_id_engine, DISEASE_LOCAL_THRESHOLD)
+
+
+def stats() -> dict:
+    return {
+        **detector.stats,
+        "local_available": local_engine.is_available(),
+        "plant_id_available": plant_id_engine.is_available(),
+    }
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+# Perceptual hashes are split into BANDS 16-bit bands, each indexed separately.
+# Two hashes within Hamming distance < BANDS must agree on at least one band
+# (pigeonhole), so near-duplicate lookup only scans rows sharing a band.
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def _signed(h: int) -> int:
+    # SQLite INTEGER is signed 64-bit
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+
+def _bands(h: int) -> list:
+    return [(h >> (i * BAND_BITS)) & BAND_MASK for i in range(BANDS)]
+
+
+class DiskCache:
+    """
+    SQLite-backed result cache keyed by content hash, with optional
+    near-duplicate lookup by 64-bit perceptual hash.
+
+    Entries expire after `ttl` seconds; once the stored payloads exceed
+    `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, ttl: float, max_bytes: int, max_distance: int = 3):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_distance = min(max_distance, BANDS - 1)
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        band_cols = ", ".join(f"band{i} INTEGER" for i in range(BANDS))
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS entries ("
+            f"key TEXT PRIMARY KEY, phash INTEGER, {band_cols}, "
+            f"value TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        for i in range(BANDS):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_band{i} ON entries (band{i})")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries (accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_created ON entries (created_at)")
+        self._conn.commit()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _touch(self, key: str):
+        self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[Any]:
+        """
+        Pass count_miss=False when a get_similar lookup follows, so one request counts one miss.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND created_at > ?", (key, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._touch(key)
+            self.hits += 1
+            return json.loads(row[0])
+
+    def get_similar(self, phash: int) -> Optional[Any]:
+        """
+        Return the closest fresh entry within max_distance bits of `phash`.
+        """
+        bands = _bands(phash)
+        where = " OR ".join(f"band{i} = ?" for i in range(BANDS))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, phash, value FROM entries WHERE ({where}) AND created_at > ?",
+                (*bands, time.time() - self.ttl),
+            ).fetchall()
+            best = None
+            for key, other, value in rows:
+                if other is None:
+                    continue
+                distance = bin((other & ((1 << 64) - 1)) ^ phash).count("1")
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, key, value)
+            if best is None:
+                self.misses += 1
+                return None
+            self._touch(best[1])
+            self.similar_hits += 1
+            return json.loads(best[2])
+
+    def set(self, key: str, value: Any, phash: Optional[int] = None):
+        payload = json.dumps(value)
+        size = len(payload)
+        bands = _bands(phash) if phash is not None else [None] * BANDS
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if old:
+                self._bytes -= old[0]
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO entries VALUES (?, ?, {', '.join('?' * BANDS)}, ?, ?, ?, ?)",
+                (key, _signed(phash) if phash is not None else None, *bands, payload, size, now, now),
+            )
+            self._bytes += size
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        expired = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries WHERE created_at <= ?", (now - self.ttl,)
+        ).fetchone()[0]
+        if expired:
+            self._conn.execute("DELETE FROM entries WHERE created_at <= ?", (now - self.ttl,))
+            self._bytes -= expired
+        while self._bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._bytes -= size
+                if self._bytes <= self.max_bytes:
+                    break
+
+    # Async wrappers keep SQLite I/O off the event loop
+    async def get_async(self, key: str, count_miss: bool = True) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key, count_miss)
+
+    async def get_similar_async(self, phash: int) -> Optional[Any]:
+        return await asyncio.to_thread(self.get_similar, phash)
+
+    async def set_async(self, key: str, value: Any, phash: Optional[int] = None):
+        await asyncio.to_thread(self.set, key, value, phash)
+
+    def stats(self) -> dict:
+        total = self.hits + self.similar_hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.similar_hits) / total, 3) if total else 0.0,
+        }
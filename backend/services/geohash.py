@@ -0,0 +1,115 @@
+import math
+from typing import List, Tuple
+
+# Minimal geohash: encode points to cell keys and list the cells covering a circle.
+# Cells at precision 5 are ~4.9 x 4.9 km, at precision 6 ~1.2 x 0.6 km (at the equator).
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+EARTH_RADIUS_KM = 6371.0
+
+
+def encode(lat: float, lon: float, precision: int) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def bbox(cell: str) -> Tuple[float, float, float, float]:
+    """
+    (min_lat, min_lon, max_lat, max_lon) of a cell.
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for c in cell:
+        value = _DECODE[c]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """
+    (height, width) of cells at `precision`, in degrees.
+    """
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_to_cell_km(lat: float, lon: float, cell: str) -> float:
+    """
+    Distance from a point to the nearest point of a cell (0 inside it).
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox(cell)
+    return haversine_km(lat, lon, min(max(lat, min_lat), max_lat), min(max(lon, min_lon), max_lon))
+
+
+def _cell_from_indices(i: int, j: int, precision: int) -> str:
+    # Interleave lon (even) and lat (odd) bits, most significant first
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    value = 0
+    for k in range(bits):
+        if k % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | ((j >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((i >> lat_bits) & 1)
+    return "".join(_BASE32[(value >> (5 * (precision - 1 - n))) & 31] for n in range(precision))
+
+
+def cover(lat: float, lon: float, radius_km: float, precision: int) -> List[Tuple[str, float]]:
+    """
+    Cells at `precision` that intersect the circle, with each cell's distance from the centre.
+    Walks the cell grid by index, so no cell is decoded.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+    height, width = cell_size(precision)
+    bits = 5 * precision
+    n_lat, n_lon = 2 ** (bits // 2), 2 ** ((bits + 1) // 2)
+
+    i0 = max(int((lat - dlat + 90.0) // height), 0)
+    i1 = min(int((lat + dlat + 90.0) // height), n_lat - 1)
+    j0 = int((lon - dlon + 180.0) // width)
+    j1 = int((lon + dlon + 180.0) // width)
+    cells = []
+    for i in range(i0, i1 + 1):
+        min_lat = -90.0 + i * height
+        near_lat = min(max(lat, min_lat), min_lat + height)
+        if haversine_km(lat, lon, near_lat, lon) > radius_km:
+            continue
+        for j in range(j0, j1 + 1):
+            min_lon = -180.0 + j * width
+            distance = haversine_km(lat, lon, near_lat, min(max(lon, min_lon), min_lon + width))
+            if distance <= radius_km:
+                cells.append((_cell_from_indices(i, j % n_lon, precision), distance))
+    return cells
@@ -0,0 +1,140 @@
+import os
+import httpx
+from typing import Callable, List, Optional
+
+# Shared outbound HTTP client.
+# One connection-pooled AsyncClient is created in the FastAPI lifespan hook
+# (see main.py) and reused by every router that talks to an external API,
+# so repeated calls to Open-Meteo / Plant.id reuse warm TCP+TLS connections.
+
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+_client: Optional[httpx.AsyncClient] = None
+
+# Pool usage counters, exposed through /metrics
+_stats = {
+    "in_flight": 0,
+    "peak_in_flight": 0,
+    "requests": 0,
+    "saturation_events": 0,
+}
+
+# Callbacks invoked as fn(in_flight, max_connections) whenever every pooled
+# connection is busy. Useful for alerting or adaptive load shedding.
+_saturation_hooks: List[Callable[[int, int], None]] = []
+
+
+def on_saturation(hook: Callable[[int, int], None]):
+    """
+    Register a callback fired when the connection pool is saturated.
+    """
+    _saturation_hooks.append(hook)
+
+
+def _release():
+    _stats["in_flight"] -= 1
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    """
+    Response body wrapper that releases the in-flight slot once the body is
+    closed, so streamed responses count against the pool until they finish.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream):
+        self._stream = stream
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                _release()
+
+
+class _MeteredTransport(httpx.AsyncHTTPTransport):
+    """
+    Transport that counts concurrent upstream requests against the pool size.
+    A request stays in flight until its response body is closed.
+    """
+
+    async def handle_async_request(self, request):
+        _stats["in_flight"] += 1
+        _stats["requests"] += 1
+        if _stats["in_flight"] > _stats["peak_in_flight"]:
+            _stats["peak_in_flight"] = _stats["in_flight"]
+        if _stats["in_flight"] >= MAX_CONNECTIONS:
+            _stats["saturation_events"] += 1
+            for hook in _saturation_hooks:
+                try:
+                    hook(_stats["in_flight"], MAX_CONNECTIONS)
+                except Exception as e:
+                    print(f"HTTP saturation hook error: {e}")
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            _release()
+            raise
+        response.stream = _MeteredStream(response.stream)
+        return response
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=CONNECT_TIMEOUT,
+        read=READ_TIMEOUT,
+        write=READ_TIMEOUT,
+        pool=POOL_TIMEOUT,
+    )
+    transport = _MeteredTransport(http2=HTTP2_ENABLED, limits=limits)
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+async def startup():
+    global _client
+    if _client is None:
+        _client = _build_client()
+
+
+async def shutdown():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the application-scoped client.
+    Falls back to creating one lazily (e.g. when a router is used outside the app lifespan).
+    """
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive_connections": MAX_KEEPALIVE_CONNECTIONS,
+        "http2": HTTP2_ENABLED,
+    }
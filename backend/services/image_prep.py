@@ -0,0 +1,136 @@
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Plant.id's classifier works on downsampled inputs; anything much beyond this
+# only costs upload time on rural uplinks.
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()  # JPEG or WEBP
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+# Panoramas and very tall shots are centre-cropped to this aspect ratio
+IMAGE_MAX_ASPECT = float(os.getenv("IMAGE_MAX_ASPECT", "2.0"))
+IMAGE_PREP_WORKERS = int(os.getenv("IMAGE_PREP_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_PREP_WORKERS, thread_name_prefix="image-prep")
+
+_stats = {
+    "images": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "ms_total": 0.0,
+}
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def _center_crop(img: Image.Image) -> Image.Image:
+    w, h = img.size
+    if w > h * IMAGE_MAX_ASPECT:
+        new_w = int(h * IMAGE_MAX_ASPECT)
+        left = (w - new_w) // 2
+        return img.crop((left, 0, left + new_w, h))
+    if h > w * IMAGE_MAX_ASPECT:
+        new_h = int(w * IMAGE_MAX_ASPECT)
+        top = (h - new_h) // 2
+        return img.crop((0, top, w, top + new_h))
+    return img
+
+
+def decode(contents: bytes) -> Image.Image:
+    """
+    Decode, apply EXIF orientation and normalise to an RGB image no larger than IMAGE_MAX_SIDE.
+    """
+    try:
+        img = Image.open(io.BytesIO(contents))
+        # Let the JPEG decoder downscale by 2/4/8 while decoding; much cheaper than a full decode
+        img.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        img = ImageOps.exif_transpose(img)
+        # Pixel data is only read from here on, so truncated uploads fail in these calls
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img = _center_crop(img)
+        img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(f"Could not read image: {e}")
+    return img
+
+
+def encode(img: Image.Image) -> bytes:
+    out = io.BytesIO()
+    if IMAGE_FORMAT == "WEBP":
+        img.save(out, format="WEBP", quality=IMAGE_QUALITY, method=4)
+    else:
+        img.save(out, format="JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def dhash(img: Image.Image) -> int:
+    """
+    64-bit difference hash: stable across re-encoding, resizing and mild
+    compression, so WhatsApp-forwarded copies of a photo hash (almost) the same.
+    """
+    small = img.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    h = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            h = (h << 1) | (1 if left > right else 0)
+    return h
+
+
+def prepare(contents: bytes) -> dict:
+    """
+    Synchronous preprocessing; call through prepare_async from request handlers.
+    """
+    start = time.perf_counter()
+    img = decode(contents)
+    data = encode(img)
+    phash = dhash(img)
+    mime_type = "image/webp" if IMAGE_FORMAT == "WEBP" else "image/jpeg"
+    # Already-small uploads can come out larger after re-encoding; send the original then
+    if len(data) >= len(contents):
+        data = contents
+        mime_type = Image.MIME.get(Image.open(io.BytesIO(contents)).format, "image/jpeg")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    _stats["images"] += 1
+    _stats["bytes_in"] += len(contents)
+    _stats["bytes_out"] += len(data)
+    _stats["ms_total"] += elapsed_ms
+
+    return {
+        "data": data,
+        "mime_type": mime_type,
+        "image": img,
+        "phash": phash,
+        "report": {
+            "bytes_in": len(contents),
+            "bytes_out": len(data),
+            "bytes_saved": len(contents) - len(data),
+            "size": list(img.size),
+            "ms": round(elapsed_ms, 1),
+        },
+    }
+
+
+async def prepare_async(contents: bytes) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, prepare, contents)
+
+
+def stats() -> dict:
+    images = _stats["images"]
+    return {
+        **_stats,
+        "ms_total": round(_stats["ms_total"], 1),
+        "bytes_saved": _stats["bytes_in"] - _stats["bytes_out"],
+        "avg_ms": round(_stats["ms_total"] / images, 1) if images else 0.0,
+    }
@@ -0,0 +1,113 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+# Incremental parser for a streamed JSON object.
+#
+# Text is fed chunk by chunk as the model produces it. Every top-level field is
+# reported as soon as its value is complete, and elements of the configured
+# array fields are reported one by one, so a client can render the first phase
+# of a plan while the model is still writing the rest.
+
+
+class IncrementalJSONParser:
+    """
+    feed() returns a list of events:
+      ("item", field, index, raw)  - an element of an array field in `item_fields` closed
+      ("field", field, raw)        - a top-level field's value closed
+    `raw` is the exact JSON text of the value; decoding (and coping with bad
+    values) is left to the caller. `complete` turns True once the object closes.
+    """
+
+    def __init__(self, item_fields: Tuple[str, ...] = ()):
+        self.item_fields = item_fields
+        self.buffer = ""
+        self.complete = False
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._awaiting_value = False
+        self._string_start = 0
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self.items_done: Dict[str, int] = {}
+
+    @property
+    def current_field(self) -> Optional[str]:
+        """
+        Top-level field whose value is being written right now, if any.
+        """
+        return self._key if self._value_start is not None else None
+
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        events = []
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            if self.complete:
+                break
+            c = buf[i]
+            depth = len(self._stack)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if depth == 1 and self._expect_key:
+                        self._key = json.loads(buf[self._string_start:i + 1])
+                        self._expect_key = False
+                    elif depth == 1 and self._value_start is not None:
+                        events.append(("field", self._key, buf[self._value_start:i + 1]))
+                        self._value_start = None
+                continue
+
+            if c.isspace():
+                continue
+
+            if depth == 1 and self._awaiting_value:
+                self._awaiting_value = False
+                self._value_start = i
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                if depth == 2 and self._stack[-1] == "[" and self._key in self.item_fields:
+                    self._item_start = i
+                self._stack.append(c)
+            elif c in "}]":
+                self._stack.pop()
+                depth = len(self._stack)
+                if depth == 0:
+                    self._close_scalar(buf, i, events)
+                    self.complete = True
+                elif depth == 2 and self._item_start is not None:
+                    index = self.items_done.get(self._key, 0)
+                    events.append(("item", self._key, index, buf[self._item_start:i + 1]))
+                    self.items_done[self._key] = index + 1
+                    self._item_start = None
+                elif depth == 1 and self._value_start is not None:
+                    events.append(("field", self._key, buf[self._value_start:i + 1]))
+                    self._value_start = None
+            elif c == ":" and depth == 1:
+                self._awaiting_value = True
+            elif c == "," and depth == 1:
+                self._close_scalar(buf, i, events)
+                self._expect_key = True
+
+            if c == "{" and depth == 0:
+                self._expect_key = True
+
+        self._pos = len(buf)
+        return events
+
+    def _close_scalar(self, buf: str, end: int, events: list):
+        # Numbers, booleans and null end at the next "," or "}" of the object
+        if self._value_start is not None:
+            events.append(("field", self._key, buf[self._value_start:end].strip()))
+            self._value_start = None
@@ -0,0 +1,210 @@
+import asyncio
+import io
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Type
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from services import singleflight
+
+load_dotenv()
+
+# Shared Gemini client for every router.
+# Calls go through the SDK's async API so the event loop is never blocked, and
+# each model gets its own concurrency limit, deadline and retry policy.
+
+GEMINI_API_KEY = os.getenv("GEMINI_DOCTOR_KEY")
+if not GEMINI_API_KEY:
+    print("WARNING: GEMINI_DOCTOR_KEY not found in environment variables")
+else:
+    genai.configure(api_key=GEMINI_API_KEY)
+
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Total time budget for a call, including retries
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+
+RETRYABLE = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class LLMError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def is_configured() -> bool:
+    return bool(GEMINI_API_KEY)
+
+
+class LLMClient:
+    def __init__(self, model_name: str, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._stats = {
+            "queued": 0,
+            "active": 0,
+            "requests": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "errors": 0,
+        }
+
+    async def _acquire(self, deadline: float):
+        loop = asyncio.get_running_loop()
+        self._stats["queued"] += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise LLMError(503, "AI service is busy, please try again")
+        finally:
+            self._stats["queued"] -= 1
+        self._stats["active"] += 1
+
+    def _release(self):
+        self._stats["active"] -= 1
+        self._semaphore.release()
+
+    async def _call(self, contents: Any, generation_config: Optional[dict], stream: bool, deadline: float):
+        """
+        Start a generation, retrying transient errors until `deadline` (loop time).
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                return await asyncio.wait_for(
+                    self.model.generate_content_async(contents, generation_config=generation_config, stream=stream),
+                    timeout=remaining,
+                )
+            except asyncio.TimeoutError:
+                self._stats["timeouts"] += 1
+                raise LLMError(504, "AI service timed out")
+            except RETRYABLE as e:
+                if attempt == LLM_MAX_RETRIES:
+                    self._stats["errors"] += 1
+                    raise LLMError(503, f"AI service unavailable: {e}")
+                self._stats["retries"] += 1
+                await asyncio.sleep(min(LLM_BACKOFF_BASE * 2 ** attempt, max(deadline - loop.time(), 0)))
+        self._stats["timeouts"] += 1
+        raise LLMError(504, "AI service timed out")
+
+    async def generate(self, contents: Any, generation_config: Optional[dict] = None, dedupe_key: Optional[str] = None) -> str:
+        """
+        Return the full response text. Callers passing `dedupe_key` share one
+        call with concurrent identical requests.
+        """
+        async def run():
+            deadline = asyncio.get_running_loop().time() + LLM_DEADLINE
+            self._stats["requests"] += 1
+            await self._acquire(deadline)
+            try:
+                response = await self._call(contents, generation_config, False, deadline)
+                return response.text
+            finally:
+                self._release()
+
+        if dedupe_key is None:
+            return await run()
+        return await singleflight.gemini.do(dedupe_key, run)
+
+    async def stream(self, contents: Any, generation_config: Optional[dict] = None) -> AsyncIterator[str]:
+        """
+        Yield text chunks as they arrive. The concurrency slot is held until the stream ends.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LLM_DEADLINE
+        self._stats["requests"] += 1
+        await self._acquire(deadline)
+        try:
+            response = await self._call(contents, generation_config, True, deadline)
+            iterator = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), timeout=max(deadline - loop.time(), 0))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self._stats["timeouts"] += 1
+                    raise LLMError(504, "AI service timed out")
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        return {**self._stats, "max_concurrency": self.max_concurrency}
+
+
+def response_schema(model: Type[BaseModel]) -> dict:
+    """
+    Convert a Pydantic model to the OpenAPI subset Gemini accepts as
+    `response_schema`: references inlined, titles and defaults dropped.
+    """
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def convert(node: dict) -> dict:
+        if "$ref" in node:
+            node = defs[node["$ref"].split("/")[-1]]
+        out = {"type": node["type"].upper()}
+        if "description" in node:
+            out["description"] = node["description"]
+        if "enum" in node:
+            out["format"] = "enum"
+            out["enum"] = node["enum"]
+        if node["type"] == "object":
+            out["properties"] = {name: convert(prop) for name, prop in node["properties"].items()}
+            out["required"] = node.get("required", [])
+        elif node["type"] == "array":
+            out["items"] = convert(node["items"])
+        return out
+
+    return convert(schema)
+
+
+# Gemini keeps uploaded files for 48 hours
+FILE_TTL = 47 * 3600
+
+
+async def upload_image(data: bytes, mime_type: str) -> dict:
+    """
+    Upload an image to the Gemini File API so later turns can reference it
+    by URI instead of resending the bytes. Returns a JSON-serializable ref.
+    """
+    uploaded = await asyncio.to_thread(genai.upload_file, io.BytesIO(data), mime_type=mime_type)
+    return {"uri": uploaded.uri, "name": uploaded.name, "mime_type": mime_type, "expires_at": time.time() + FILE_TTL}
+
+
+def file_part(ref: dict) -> dict:
+    return {"file_data": {"mime_type": ref["mime_type"], "file_uri": ref["uri"]}}
+
+
+_clients: Dict[str, LLMClient] = {}
+
+
+def get_model(model_name: str = DEFAULT_MODEL) -> LLMClient:
+    if model_name not in _clients:
+        _clients[model_name] = LLMClient(model_name)
+    return _clients[model_name]
+
+
+def stats() -> dict:
+    return {name: client.stats() for name, client in _clients.items()}
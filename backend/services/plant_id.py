@@ -0,0 +1,123 @@
+import asyncio
+import os
+import random
+from typing import List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from services import http_client
+
+load_dotenv()
+
+PLANT_ID_API_KEY = os.getenv("PLANT_ID_API_KEY")
+PLANT_ID_URL = "https://api.plant.id/v2/health_assessment"
+
+PLANT_ID_TIMEOUT = float(os.getenv("PLANT_ID_TIMEOUT", "30"))
+PLANT_ID_MAX_RETRIES = int(os.getenv("PLANT_ID_MAX_RETRIES", "3"))
+PLANT_ID_BACKOFF_BASE = float(os.getenv("PLANT_ID_BACKOFF_BASE", "0.5"))
+PLANT_ID_BACKOFF_MAX = float(os.getenv("PLANT_ID_BACKOFF_MAX", "8"))
+# Upper bound on concurrent Plant.id calls from this worker
+PLANT_ID_MAX_CONCURRENCY = int(os.getenv("PLANT_ID_MAX_CONCURRENCY", "8"))
+
+# Plant.id scores up to this many images of the same plant in one assessment
+PLANT_ID_MAX_IMAGES_PER_CALL = int(os.getenv("PLANT_ID_MAX_IMAGES_PER_CALL", "5"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_semaphore = asyncio.Semaphore(PLANT_ID_MAX_CONCURRENCY)
+
+
+class PlantIdError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def is_configured() -> bool:
+    return bool(PLANT_ID_API_KEY)
+
+
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+    """
+    Full-jitter exponential backoff, honouring Retry-After when Plant.id sends one.
+    """
+    if retry_after:
+        try:
+            return min(float(retry_after), PLANT_ID_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(PLANT_ID_BACKOFF_MAX, PLANT_ID_BACKOFF_BASE * 2 ** attempt))
+
+
+async def health_assessment(encoded_images: List[str]) -> dict:
+    """
+    Run a Plant.id health assessment on base64-encoded images of one plant.
+    """
+    if not PLANT_ID_API_KEY:
+        raise PlantIdError(500, "Server misconfigured: Missing Plant.id API Key")
+
+    headers = {
+        "Content-Type": "application/json",
+        "Api-Key": PLANT_ID_API_KEY,
+    }
+    data = {
+        "images": encoded_images,
+        "modifiers": ["similar_images"],
+        "disease_details": ["description", "treatment", "cause"],
+    }
+
+    client = http_client.get_client()
+    async with _semaphore:
+        for attempt in range(PLANT_ID_MAX_RETRIES + 1):
+            last_attempt = attempt == PLANT_ID_MAX_RETRIES
+            try:
+                response = await client.post(PLANT_ID_URL, json=data, headers=headers, timeout=PLANT_ID_TIMEOUT)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise PlantIdError(504, f"Plant.id unreachable: {e}")
+                await asyncio.sleep(_backoff(attempt))
+                continue
+
+            if response.status_code == 200:
+                return response.json()
+
+            if response.status_code in RETRY_STATUSES and not last_attempt:
+                print(f"Plant.id {response.status_code}, retrying (attempt {attempt + 1})")
+                await asyncio.sleep(_backoff(attempt, response.headers.get("Retry-After")))
+                continue
+
+            print(f"Plant.id Error: {response.text}")
+            raise PlantIdError(response.status_code, "Failed to analyze image with Plant.id")
+
+
+def summarize(result: dict) -> dict:
+    """
+    Reduce a Plant.id health assessment to the fields the app shows.
+    """
+    # Extract most likely disease
+    if not result.get("health_assessment", {}).get("diseases"):
+        return {
+            "disease": "Healthy",
+            "confidence": 0.99,
+            "treatment": "Keep up the good work!",
+            "prevention": []
+        }
+
+    top_match = result["health_assessment"]["diseases"][0]
+
+    disease_name = top_match.get("name", "Unknown Issue")
+    confidence = top_match.get("probability", 0)
+
+    # Extract treatment info if available
+    details = top_match.get("disease_details", {})
+    treatment_desc = details.get("treatment", {}).get("biological", []) + details.get("treatment", {}).get("chemical", [])
+
+    treatment_str = " ".join(treatment_desc[:2]) if treatment_desc else "Consult an expert."
+
+    return {
+        "disease": disease_name,
+        "confidence": round(confidence, 2),
+        "treatment": treatment_str
+    }
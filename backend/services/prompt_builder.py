@@ -0,0 +1,160 @@
+import asyncio
+import os
+from typing import List, Set
+
+from services import llm, sessions
+
+# Token-budgeted prompt assembly for multi-turn chats.
+#
+# The prompt always keeps the system prefix, the rolling summary and the new
+# message, then as many of the latest turns as fit in PROMPT_TOKEN_BUDGET.
+# Turns that fall out of the window are folded into the session summary by a
+# background task, so summarisation never adds latency to the request.
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "150"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", llm.DEFAULT_MODEL)
+
+SUMMARY_PROMPT = """Summarise this conversation between a farmer and an agricultural doctor
+in at most {words} words. Keep the crop, symptoms, diagnoses, treatments already suggested
+and anything the farmer said they tried. Write in English.
+
+{previous}Conversation:
+{turns}
+
+Summary:"""
+
+_stats = {
+    "requests": 0,
+    "prompt_tokens_total": 0,
+    "prompt_tokens_max": 0,
+    "truncated": 0,
+    "summaries": 0,
+    "summary_errors": 0,
+    "summary_conflicts": 0,
+}
+
+_summarizing: Set[str] = set()
+_tasks: Set[asyncio.Task] = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local estimate (count_tokens is a network round-trip).
+    English averages ~4 characters per token; Indic scripts tokenize far
+    less efficiently, so non-ASCII characters are weighted more heavily.
+    """
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    other_chars = len(text) - ascii_chars
+    return ascii_chars // 4 + int(other_chars / 1.5) + 1
+
+
+def _format_turn(msg: dict) -> str:
+    role = "Farmer" if msg.get("role") == "user" else "AI Doctor"
+    return f"{role}: {msg.get('content', '')}\n"
+
+
+def build(session: dict, prefix: str, message: str, extra: str = "", budget: int = PROMPT_TOKEN_BUDGET) -> dict:
+    """
+    Assemble the prompt for `session` within `budget` tokens.
+    Returns {"prompt", "usage"}.
+    """
+    history: List[dict] = session["history"]
+    summarized_upto = session.get("summarized_upto", 0)
+    summary = session.get("summary") or ""
+
+    head = prefix + extra
+    if summary:
+        head += f"\nSummary of earlier conversation: {summary}\n"
+    tail = f"\nFarmer: {message}\nAI Doctor:"
+    used = estimate_tokens(head) + estimate_tokens(tail) + estimate_tokens("\nChat History:\n")
+
+    # Walk back from the newest turn until the budget runs out
+    included: List[str] = []
+    cutoff = len(history)
+    for i in range(len(history) - 1, summarized_upto - 1, -1):
+        line = _format_turn(history[i])
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        included.append(line)
+        used += cost
+        cutoff = i
+
+    prompt = head + "\nChat History:\n" + "".join(reversed(included)) + tail
+
+    dropped = cutoff - summarized_upto
+    _stats["requests"] += 1
+    _stats["prompt_tokens_total"] += used
+    _stats["prompt_tokens_max"] = max(_stats["prompt_tokens_max"], used)
+    if dropped:
+        _stats["truncated"] += 1
+        _schedule_summary(session, cutoff)
+
+    return {
+        "prompt": prompt,
+        "usage": {
+            "prompt_tokens": used,
+            "budget": budget,
+            "turns_included": len(included),
+            "turns_summarized": summarized_upto,
+            "turns_pending_summary": dropped,
+        },
+    }
+
+
+def _schedule_summary(session: dict, cutoff: int):
+    if session["id"] in _summarizing:
+        return
+    _summarizing.add(session["id"])
+    task = asyncio.ensure_future(_summarize(session["id"], cutoff))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _summarize(session_id: str, cutoff: int):
+    """
+    Fold history[summarized_upto:cutoff] into the session summary.
+    """
+    try:
+        session = await sessions.store.get(session_id)
+        if session is None:
+            return
+        start = session.get("summarized_upto", 0)
+        turns = session["history"][start:cutoff]
+        if not turns:
+            return
+        previous = f"Earlier summary: {session['summary']}\n\n" if session.get("summary") else ""
+        prompt = SUMMARY_PROMPT.format(
+            words=SUMMARY_MAX_WORDS, previous=previous, turns="".join(_format_turn(m) for m in turns)
+        )
+        summary = await llm.get_model(SUMMARY_MODEL).generate(prompt)
+
+        # Compare-and-set on summarized_upto: the session may have gained turns,
+        # been trimmed or been summarized by another worker meanwhile
+        def apply(stored: dict) -> bool:
+            if stored.get("summarized_upto", 0) != start:
+                return False
+            stored["summary"] = summary.strip()
+            stored["summarized_upto"] = min(cutoff, len(stored["history"]))
+            return True
+
+        if await sessions.store.update(session_id, apply):
+            _stats["summaries"] += 1
+        else:
+            _stats["summary_conflicts"] += 1
+    except Exception as e:
+        _stats["summary_errors"] += 1
+        print(f"Summary Error: {e}")
+    finally:
+        _summarizing.discard(session_id)
+
+
+def stats() -> dict:
+    requests = _stats["requests"]
+    return {
+        **_stats,
+        "budget": PROMPT_TOKEN_BUDGET,
+        "prompt_tokens_avg": round(_stats["prompt_tokens_total"] / requests, 1) if requests else 0.0,
+        "summaries_in_flight": len(_summarizing),
+    }
@@ -0,0 +1,292 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from services import geohash
+
+# Rolling per-(district, issue) report counts for collective insights.
+#
+# Every committed report bumps one hourly and one daily counter, so insights
+# cost O(buckets) per issue no matter how many reports were filed. Hourly
+# buckets serve the 24h window; daily buckets serve 7d/30d and the baseline.
+# Days follow local time (IST by default) so "today" means the farmer's today.
+
+AGG_TZ_OFFSET = int(os.getenv("AGG_TZ_OFFSET", str(5 * 3600 + 1800)))
+HOUR_RETENTION = 48
+DAY_RETENTION = 60
+# The baseline is the mean daily count over days 8-35 ago, before the recent window
+BASELINE_START_DAYS = 7
+BASELINE_DAYS = 28
+# Keeps a couple of reports in a quiet district from reading as a 10x spike
+BASELINE_FLOOR = float(os.getenv("AGG_BASELINE_FLOOR", "0.5"))
+RISK_HIGH_RATIO = float(os.getenv("AGG_RISK_HIGH_RATIO", "3.0"))
+RISK_HIGH_MIN = int(os.getenv("AGG_RISK_HIGH_MIN", "5"))
+RISK_MEDIUM_RATIO = float(os.getenv("AGG_RISK_MEDIUM_RATIO", "1.5"))
+RISK_MEDIUM_MIN = int(os.getenv("AGG_RISK_MEDIUM_MIN", "3"))
+
+RISK_ORDER = {"High": 0, "Medium": 1, "Low": 2}
+
+# Nearby queries sum per-cell counters: ~1.2 km cells for small radii, ~4.9 km beyond
+CELL_PRECISIONS = (5, 6)
+FINE_RADIUS_KM = 5.0
+
+
+def hour_index(ts: float) -> int:
+    return int(ts // 3600)
+
+
+def day_index(ts: float) -> int:
+    return int((ts + AGG_TZ_OFFSET) // 86400)
+
+
+class RollingCounter:
+    __slots__ = ("hours", "days")
+
+    def __init__(self):
+        self.hours: Dict[int, int] = {}
+        self.days: Dict[int, int] = {}
+
+    def add(self, hour: int, day: int, n: int = 1):
+        self.hours[hour] = self.hours.get(hour, 0) + n
+        self.days[day] = self.days.get(day, 0) + n
+
+    def merge(self, other: "RollingCounter"):
+        for hour, n in other.hours.items():
+            self.hours[hour] = self.hours.get(hour, 0) + n
+        for day, n in other.days.items():
+            self.days[day] = self.days.get(day, 0) + n
+
+    def last_hours(self, now: float, hours: int) -> int:
+        current = hour_index(now)
+        return sum(self.hours.get(h, 0) for h in range(current - hours + 1, current + 1))
+
+    def last_days(self, now: float, days: int, skip: int = 0) -> int:
+        """
+        Count over `days` local days ending `skip` days before today (today included when skip=0).
+        """
+        today = day_index(now) - skip
+        return sum(self.days.get(d, 0) for d in range(today - days + 1, today + 1))
+
+    def prune(self, now: float) -> bool:
+        """
+        Drop expired buckets; returns True when nothing is left.
+        """
+        oldest_hour = hour_index(now) - HOUR_RETENTION
+        oldest_day = day_index(now) - DAY_RETENTION
+        self.hours = {h: c for h, c in self.hours.items() if h > oldest_hour}
+        self.days = {d: c for d, c in self.days.items() if d > oldest_day}
+        return not self.days
+
+
+def assess(counter: RollingCounter, now: float) -> dict:
+    """
+    Windows, baseline and risk for one (district, issue) counter.
+    """
+    count_24h = counter.last_hours(now, 24)
+    count_7d = counter.last_days(now, 7)
+    count_30d = counter.last_days(now, 30)
+    baseline = counter.last_days(now, BASELINE_DAYS, skip=BASELINE_START_DAYS) / BASELINE_DAYS
+    ratio = count_24h / max(baseline, BASELINE_FLOOR)
+
+    if count_24h >= RISK_HIGH_MIN and ratio >= RISK_HIGH_RATIO:
+        risk = "High"
+    elif count_24h >= RISK_MEDIUM_MIN and ratio >= RISK_MEDIUM_RATIO:
+        risk = "Medium"
+    else:
+        risk = "Low"
+
+    weekly_rate = count_7d / 7
+    if weekly_rate > max(baseline, BASELINE_FLOOR) * RISK_MEDIUM_RATIO:
+        trend = "rising"
+    elif weekly_rate < baseline / RISK_MEDIUM_RATIO:
+        trend = "falling"
+    else:
+        trend = "steady"
+
+    return {
+        "count": count_7d,
+        "risk": risk,
+        "trend": trend,
+        "windows": {"24h": count_24h, "7d": count_7d, "30d": count_30d},
+        "baseline_daily": round(baseline, 2),
+        "ratio": round(ratio, 2),
+    }
+
+
+class ReportAggregates:
+    def __init__(self):
+        self._counters: Dict[Tuple[str, str], RollingCounter] = {}
+        self._issues: Dict[str, Set[str]] = defaultdict(set)
+        # Ingest runs on the event loop, the startup rebuild in a thread
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.updates = 0
+
+    def add(self, district: str, issue: str, ts: float):
+        self._add(district, issue, hour_index(ts), day_index(ts), 1)
+
+    def _add(self, district: str, issue: str, hour: int, day: int, n: int):
+        with self._lock:
+            key = (district, issue)
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = RollingCounter()
+                self._issues[district].add(issue)
+            counter.add(hour, day, n)
+            self.updates += n
+
+    def add_batch(self, reports: List[dict]):
+        """
+        report_store listener: fold a committed batch into the counters.
+        """
+        for report in reports:
+            self.add(report["district"], report["issue"], report["reported_at"])
+        now = time.time()
+        if now - self._last_prune > 3600:
+            self.prune(now)
+
+    def prune(self, now: float):
+        with self._lock:
+            self._last_prune = now
+            for key in [k for k, c in self._counters.items() if c.prune(now)]:
+                del self._counters[key]
+                self._issues[key[0]].discard(key[1])
+                if not self._issues[key[0]]:
+                    del self._issues[key[0]]
+
+    def rebuild(self, store):
+        """
+        Recount from the report store at startup; only the retained days are scanned.
+        """
+        since = time.time() - DAY_RETENTION * 86400
+        rows = store.query(
+            "SELECT district, issue, CAST(reported_at / 3600 AS INTEGER) AS hour, "
+            "CAST((reported_at + ?) / 86400 AS INTEGER) AS day, COUNT(*) FROM reports "
+            "WHERE reported_at >= ? GROUP BY district, issue, hour, day",
+            (AGG_TZ_OFFSET, since),
+        )
+        with self._lock:
+            self._counters.clear()
+            self._issues.clear()
+        for district, issue, hour, day, count in rows:
+            self._add(district, issue, hour, day, count)
+
+    def assess_series(self, district: str, issue: str, now: float) -> Optional[dict]:
+        with self._lock:
+            counter = self._counters.get((district, issue))
+            return assess(counter, now) if counter is not None else None
+
+    def district_insights(self, district: str, now: Optional[float] = None) -> List[dict]:
+        now = now or time.time()
+        with self._lock:
+            results = [
+                {"issue": issue, **assess(self._counters[(district, issue)], now)}
+                for issue in self._issues.get(district, ())
+            ]
+        results = [r for r in results if r["windows"]["30d"]]
+        return sorted(results, key=lambda r: (RISK_ORDER[r["risk"]], -r["windows"]["24h"], -r["count"]))
+
+    def stats(self) -> dict:
+        return {
+            "districts": len(self._issues),
+            "series": len(self._counters),
+            "updates": self.updates,
+        }
+
+
+class CellAggregates:
+    """
+    The same rolling counters keyed by (geohash cell, issue), so "issues within
+    R km" costs O(cells covering the circle), independent of report volume.
+    """
+
+    def __init__(self):
+        # precision -> cell -> issue -> counter
+        self._cells: Dict[int, Dict[str, Dict[str, RollingCounter]]] = {p: {} for p in CELL_PRECISIONS}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def _add(self, cell: str, issue: str, hour: int, day: int, n: int):
+        with self._lock:
+            for precision, table in self._cells.items():
+                issues = table.setdefault(cell[:precision], {})
+                counter = issues.get(issue)
+                if counter is None:
+                    counter = issues[issue] = RollingCounter()
+                counter.add(hour, day, n)
+
+    def add_batch(self, reports: List[dict]):
+        for report in reports:
+            if report.get("cell"):
+                ts = report["reported_at"]
+                self._add(report["cell"], report["issue"], hour_index(ts), day_index(ts), 1)
+        now = time.time()
+        if now - self._last_prune > 3600:
+            self.prune(now)
+
+    def prune(self, now: float):
+        with self._lock:
+            self._last_prune = now
+            for table in self._cells.values():
+                for cell in list(table):
+                    issues = table[cell]
+                    for issue in [i for i, c in issues.items() if c.prune(now)]:
+                        del issues[issue]
+                    if not issues:
+                        del table[cell]
+
+    def rebuild(self, store):
+        since = time.time() - DAY_RETENTION * 86400
+        finest = max(CELL_PRECISIONS)
+        rows = store.query(
+            "SELECT substr(cell, 1, ?) AS c, issue, CAST(reported_at / 3600 AS INTEGER) AS hour, "
+            "CAST((reported_at + ?) / 86400 AS INTEGER) AS day, COUNT(*) FROM reports "
+            "WHERE cell IS NOT NULL AND reported_at >= ? GROUP BY c, issue, hour, day",
+            (finest, AGG_TZ_OFFSET, since),
+        )
+        with self._lock:
+            for table in self._cells.values():
+                table.clear()
+        for cell, issue, hour, day, count in rows:
+            self._add(cell, issue, hour, day, count)
+
+    def assess_series(self, cell: str, issue: str, now: float) -> Optional[dict]:
+        """
+        Risk for one issue in one cell; the cell's length selects the precision.
+        """
+        with self._lock:
+            counter = self._cells[len(cell)].get(cell, {}).get(issue)
+            return assess(counter, now) if counter is not None else None
+
+    def nearby(self, lat: float, lon: float, radius_km: float, days: int, now: Optional[float] = None) -> List[dict]:
+        """
+        Issues reported in cells intersecting the circle over the last `days`
+        days, highest risk first. Edge cells count whole, so the effective
+        radius can exceed `radius_km` by up to one cell.
+        """
+        now = now or time.time()
+        precision = max(CELL_PRECISIONS) if radius_km <= FINE_RADIUS_KM else min(CELL_PRECISIONS)
+        merged: Dict[str, RollingCounter] = {}
+        nearest: Dict[str, float] = {}
+        with self._lock:
+            table = self._cells[precision]
+            for cell, distance in geohash.cover(lat, lon, radius_km, precision):
+                for issue, counter in table.get(cell, {}).items():
+                    merged.setdefault(issue, RollingCounter()).merge(counter)
+                    nearest[issue] = min(nearest.get(issue, distance), distance)
+
+        results = []
+        for issue, counter in merged.items():
+            count = counter.last_days(now, days)
+            if count:
+                results.append({**assess(counter, now), "issue": issue, "count": count, "nearest_km": round(nearest[issue], 1)})
+        return sorted(results, key=lambda r: (RISK_ORDER[r["risk"]], r["nearest_km"], -r["count"]))
+
+    def stats(self) -> dict:
+        return {f"cells_p{p}": len(table) for p, table in self._cells.items()}
+
+
+aggregates = ReportAggregates()
+cells = CellAggregates()
@@ -0,0 +1,81 @@
+import os
+import time
+from typing import Dict, List, Tuple
+
+from services import alert_hub, report_aggregates
+
+# Turns rolling aggregates into push alerts.
+#
+# After each committed batch, only the (district, issue) and (cell, issue)
+# series the batch touched are re-assessed. When a series' risk rises to
+# ALERT_MIN_RISK or above, one alert is published to its topic; it is not
+# repeated while the risk stays there.
+
+ALERT_MIN_RISK = os.getenv("ALERT_MIN_RISK", "Medium")
+# Cells of ~4.9 km; subscribers by location follow every cell within ALERT_RADIUS_KM
+ALERT_CELL_PRECISION = 5
+ALERT_RADIUS_KM = float(os.getenv("ALERT_RADIUS_KM", "5"))
+# A series not seen for this long is treated as back to Low, so a new outbreak alerts again
+ALERT_STATE_TTL = 24 * 3600
+
+RISK_ORDER = report_aggregates.RISK_ORDER
+
+
+def district_topic(district: str) -> str:
+    return f"district:{district}"
+
+
+def cell_topic(cell: str) -> str:
+    return f"cell:{cell}"
+
+
+class AlertMonitor:
+    def __init__(self, hub: alert_hub.AlertHub):
+        self.hub = hub
+        # series key -> (last risk, when it was assessed)
+        self._state: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+        self._last_prune = 0.0
+        self.alerts = 0
+
+    def _check(self, kind: str, place: str, issue: str, assessment: dict, now: float):
+        key = (kind, place, issue)
+        previous, seen_at = self._state.get(key, ("Low", 0.0))
+        if now - seen_at > ALERT_STATE_TTL:
+            previous = "Low"
+        risk = assessment["risk"]
+        self._state[key] = (risk, now)
+        if RISK_ORDER[risk] <= RISK_ORDER[ALERT_MIN_RISK] and RISK_ORDER[risk] < RISK_ORDER[previous]:
+            topic = district_topic(place) if kind == "district" else cell_topic(place)
+            self.alerts += 1
+            self.hub.publish([topic], {
+                kind: place,
+                "issue": issue,
+                "previous_risk": previous,
+                **assessment,
+                "at": now,
+            })
+
+    def on_batch(self, reports: List[dict]):
+        """
+        report_store listener; registered after the aggregates so they already include the batch.
+        """
+        now = time.time()
+        districts = {(r["district"], r["issue"]) for r in reports}
+        cells = {(r["cell"][:ALERT_CELL_PRECISION], r["issue"]) for r in reports if r.get("cell")}
+        for district, issue in districts:
+            assessment = report_aggregates.aggregates.assess_series(district, issue, now)
+            if assessment:
+                self._check("district", district, issue, assessment, now)
+        for cell, issue in cells:
+            assessment = report_aggregates.cells.assess_series(cell, issue, now)
+            if assessment:
+                self._check("cell", cell, issue, assessment, now)
+        if now - self._last_prune > 3600:
+            self._last_prune = now
+            self._state = {k: v for k, v in self._state.items() if now - v[1] <= ALERT_STATE_TTL}
+
+    def stats(self) -> dict:
+        return {"alerts": self.alerts, "tracked_series": len(self._state), **self.hub.stats()}
+
+
+monitor = AlertMonitor(alert_hub.hub)
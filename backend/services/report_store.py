@@ -0,0 +1,181 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional
+
+# Ingest pipeline for collective crop-issue reports.
+#
+# Handlers only validate and enqueue, so their latency does not depend on disk.
+# A single background writer drains the queue and inserts whatever has
+# accumulated as one transaction: under a burst, batches grow and the cost per
+# report falls; when traffic is light, each report is written almost at once.
+
+REPORTS_DB = os.getenv(
+    "REPORTS_DB", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "reports.sqlite3")
+)
+REPORT_QUEUE_MAX = int(os.getenv("REPORT_QUEUE_MAX", "100000"))
+REPORT_BATCH_MAX = int(os.getenv("REPORT_BATCH_MAX", "5000"))
+# Reports were already acknowledged with 202, so a failed write (locked or full
+# disk) is retried with exponential backoff before the batch is given up on.
+# Inserts are idempotent (INSERT OR IGNORE on the id), so retrying is safe.
+REPORT_WRITE_RETRIES = int(os.getenv("REPORT_WRITE_RETRIES", "4"))
+REPORT_RETRY_BACKOFF = float(os.getenv("REPORT_RETRY_BACKOFF", "0.5"))
+
+COLUMNS = (
+    "id", "issue", "district", "crop", "severity", "lat", "lon", "cell", "description", "reported_at", "received_at"
+)
+# Reports carry a precision-7 geohash (~150 m); coarser cells are its prefixes
+CELL_PRECISION = 7
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class ReportStore:
+    def __init__(self, path: str, max_queue: int, batch_max: int):
+        self.path = path
+        self.batch_max = batch_max
+        self._queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._writer: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[List[dict]], None]] = []
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only risks the last transactions on power loss, not corruption
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reports ("
+            "id TEXT PRIMARY KEY, issue TEXT NOT NULL, district TEXT NOT NULL, crop TEXT, severity TEXT, "
+            "lat REAL, lon REAL, cell TEXT, description TEXT, reported_at REAL NOT NULL, received_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(reports)")}
+        if "cell" not in columns:
+            self._conn.execute("ALTER TABLE reports ADD COLUMN cell TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_district_time ON reports (district, reported_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_cell_time ON reports (cell, reported_at)")
+        self._conn.commit()
+        self._stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "written": 0,
+            "batches": 0,
+            "largest_batch": 0,
+            "write_ms_total": 0.0,
+            "write_errors": 0,
+            "write_retries": 0,
+            "dropped": 0,
+        }
+
+    def submit(self, report: dict):
+        """
+        Enqueue a validated report. Raises IngestQueueFull when the writer is
+        too far behind, so callers can shed load instead of buffering without bound.
+        """
+        try:
+            self._queue.put_nowait(report)
+        except asyncio.QueueFull:
+            self._stats["rejected"] += 1
+            raise IngestQueueFull()
+        self._stats["accepted"] += 1
+
+    def on_batch(self, listener: Callable[[List[dict]], None]):
+        """
+        Call `listener(reports)` on the event loop after each batch is committed.
+        """
+        self._listeners.append(listener)
+
+    def _write_batch(self, batch: List[dict]):
+        rows = [tuple(report.get(c) for c in COLUMNS) for report in batch]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO reports ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    rows,
+                )
+
+    async def _write_with_retry(self, batch: List[dict]) -> bool:
+        for attempt in range(REPORT_WRITE_RETRIES + 1):
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+                return True
+            except Exception as e:
+                self._stats["write_errors"] += 1
+                if attempt == REPORT_WRITE_RETRIES:
+                    print(f"Report Writer Error: dropping {len(batch)} reports after {attempt + 1} attempts: {e}")
+                    return False
+                delay = REPORT_RETRY_BACKOFF * 2 ** attempt
+                print(f"Report Writer Error: {e}; retrying {len(batch)} reports in {delay:.1f}s")
+                self._stats["write_retries"] += 1
+                # New reports keep queueing meanwhile; a full queue sheds load with 503s
+                await asyncio.sleep(delay)
+
+    async def _flush(self, batch: List[dict]):
+        start = time.perf_counter()
+        try:
+            written = await self._write_with_retry(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+        if not written:
+            self._stats["dropped"] += len(batch)
+            return
+        self._stats["write_ms_total"] += (time.perf_counter() - start) * 1000
+        self._stats["written"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        for listener in self._listeners:
+            try:
+                listener(batch)
+            except Exception as e:
+                print(f"Report Listener Error: {e}")
+
+    def _drain(self, batch: List[dict]) -> List[dict]:
+        while len(batch) < self.batch_max:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            await self._flush(self._drain([first]))
+
+    def start(self):
+        if self._writer is None:
+            self._writer = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """
+        Flush everything still queued, then stop the writer.
+        """
+        if self._writer is None:
+            return
+        await self._queue.join()
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._writer = None
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def stats(self) -> dict:
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "queued": self._queue.qsize(),
+            "avg_batch": round(self._stats["written"] / batches, 1) if batches else 0.0,
+            "avg_write_ms": round(self._stats["write_ms_total"] / batches, 2) if batches else 0.0,
+        }
+
+
+store = ReportStore(REPORTS_DB, REPORT_QUEUE_MAX, REPORT_BATCH_MAX)
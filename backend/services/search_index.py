@@ -0,0 +1,178 @@
+import math
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+# In-memory full-text index for small catalogues (schemes, products).
+#
+# Documents are tokenized per field, and BM25 scores are precomputed per
+# (term, document) at build time, so a query is a few dictionary lookups.
+# Query terms also match by prefix (for search-as-you-type) and by one edit
+# (typos and transliteration slips) through a deletion-neighbourhood index.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+MAX_EXPANSIONS = 30
+# Shorter tokens get too many accidental one-edit matches
+FUZZY_MIN_LENGTH = 4
+
+_TOKEN_RE = re.compile(r"[\wऀ-ॿಀ-೿]+")
+_HYPHENATED_RE = re.compile(r"[\wऀ-ॿಀ-೿]+(?:-[\wऀ-ॿಀ-೿]+)+")
+_STOPWORDS = {"a", "an", "and", "the", "of", "for", "to", "in", "on", "by", "with", "or", "is", "are", "at", "from"}
+
+# Zero-width joiners change rendering only
+_ZERO_WIDTH = dict.fromkeys(map(ord, "‌‍​﻿"))
+# Nukta: क़ and क are the same letter to most searchers
+_NUKTA = {"़", "಼"}
+_CHANDRABINDU = {"ँ": "ं", "ಁ": "ಂ"}
+# A nasal consonant + virama before another consonant is interchangeable with
+# anusvara ("सम्मान" / "संमान", "ಕಂಪನಿ" / "ಕಮ್ಪನಿ")
+_HALF_NASAL_RE = re.compile(r"[ङञणनम]्(?=[क-ह])|"
+                            r"[ಙಞಣನಮ]್(?=[ಕ-ಹ])")
+_ANUSVARA = {"्": "ं", "್": "ಂ"}
+
+
+def _stem(word: str) -> str:
+    # Light English suffix stripping; Indic words are left as written
+    if word.isascii():
+        for suffix in ("ing", "ies", "es", "ed", "s"):
+            if len(word) > len(suffix) + 2 and word.endswith(suffix):
+                return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def normalize(text: str) -> str:
+    text = text.translate(_ZERO_WIDTH)
+    # Decompose to strip nukta and Latin diacritics, then recompose
+    text = "".join(c for c in unicodedata.normalize("NFD", text) if c not in _NUKTA and not 0x0300 <= ord(c) <= 0x036F)
+    text = unicodedata.normalize("NFC", text).lower()
+    for src, dst in _CHANDRABINDU.items():
+        text = text.replace(src, dst)
+    return _HALF_NASAL_RE.sub(lambda m: _ANUSVARA[m.group()[-1]], text)
+
+
+def tokenize(text: str) -> List[str]:
+    text = normalize(text)
+    words = [w for w in _TOKEN_RE.findall(text) if w not in _STOPWORDS]
+    tokens = [_stem(w) for w in words]
+    # "PM-KISAN" and "PM Kisan" are also searched as "pmkisan", "e-NAM" as "enam"
+    tokens += [m.replace("-", "") for m in _HYPHENATED_RE.findall(text)]
+    tokens += [a + b for a, b in zip(words, words[1:]) if len(a) <= 2]
+    return tokens
+
+
+def _deletes(term: str) -> Set[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class SearchIndex:
+    def __init__(self, documents: List[dict], fields: Dict[str, float], facet_field: Optional[str] = None):
+        """
+        `fields` maps document fields to weights; list-valued fields are joined.
+        """
+        self.documents = documents
+        self.facet_field = facet_field
+        self._scores: Dict[str, Dict[int, float]] = {}
+        self._vocabulary: List[str] = []
+        self._neighbours: Dict[str, Set[str]] = defaultdict(set)
+        self._build(fields)
+
+    def _build(self, fields: Dict[str, float]):
+        start = time.perf_counter()
+        tfs: List[Counter] = []
+        lengths: List[float] = []
+        for doc in self.documents:
+            tf: Counter = Counter()
+            for field, weight in fields.items():
+                value = doc.get(field) or ""
+                if isinstance(value, (list, tuple)):
+                    value = " ".join(map(str, value))
+                for token in tokenize(str(value)):
+                    tf[token] += weight
+            tfs.append(tf)
+            lengths.append(sum(tf.values()))
+
+        n = len(self.documents)
+        avg_length = (sum(lengths) / n) if n else 1.0
+        postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for i, tf in enumerate(tfs):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / (avg_length or 1.0))
+            for term, freq in tf.items():
+                postings[term][i] = freq * (BM25_K1 + 1) / (freq + norm)
+        for term, docs in postings.items():
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            self._scores[term] = {i: tf_part * idf for i, tf_part in docs.items()}
+            if len(term) >= FUZZY_MIN_LENGTH:
+                for variant in _deletes(term) | {term}:
+                    self._neighbours[variant].add(term)
+        self._vocabulary = sorted(self._scores)
+        self.build_ms = (time.perf_counter() - start) * 1000
+
+    def _expand(self, token: str) -> Dict[str, float]:
+        """
+        Index terms a query token matches, with their weight.
+        """
+        matches: Dict[str, float] = {}
+        if token in self._scores:
+            matches[token] = 1.0
+        i = bisect_left(self._vocabulary, token)
+        while i < len(self._vocabulary) and len(matches) < MAX_EXPANSIONS and self._vocabulary[i].startswith(token):
+            matches.setdefault(self._vocabulary[i], PREFIX_WEIGHT)
+            i += 1
+        if len(token) >= FUZZY_MIN_LENGTH and token not in self._scores:
+            for variant in _deletes(token) | {token}:
+                for term in self._neighbours.get(variant, ()):
+                    matches.setdefault(term, FUZZY_WEIGHT)
+        return matches
+
+    def _token_scores(self, token: str) -> Dict[int, float]:
+        best: Dict[int, float] = {}
+        for term, weight in self._expand(token).items():
+            for doc, score in self._scores[term].items():
+                score *= weight
+                if score > best.get(doc, 0.0):
+                    best[doc] = score
+        return best
+
+    def search(self, query: str, facet: Optional[str] = None, limit: Optional[int] = None) -> dict:
+        """
+        Rank documents for `query`. Documents matching every query term are
+        returned; if none do, documents matching any term are. Facet counts are
+        taken before the `facet` filter so clients can show them all.
+        Returns {"hits": [(doc index, score)], "total", "facets"}.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            ranked = [(i, 0.0) for i in range(len(self.documents))]
+        else:
+            per_token = [self._token_scores(t) for t in tokens]
+            matched: Iterable[int] = set.intersection(*(set(s) for s in per_token))
+            if not matched:
+                matched = set().union(*per_token)
+            ranked = sorted(
+                ((i, sum(s.get(i, 0.0) for s in per_token)) for i in matched), key=lambda hit: (-hit[1], hit[0])
+            )
+
+        facets: Counter = Counter()
+        if self.facet_field:
+            facets.update(self.documents[i].get(self.facet_field) for i, _ in ranked)
+            if facet:
+                ranked = [hit for hit in ranked if self.documents[hit[0]].get(self.facet_field) == facet]
+
+        return {
+            "hits": ranked[:limit] if limit else ranked,
+            "total": len(ranked),
+            "facets": dict(sorted(facets.items())),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self.documents),
+            "terms": len(self._vocabulary),
+            "build_ms": round(self.build_ms, 1),
+        }
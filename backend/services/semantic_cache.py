@@ -0,0 +1,222 @@
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Semantic response cache for first-turn doctor questions.
+#
+# Questions are embedded locally (hashed word + character-trigram features,
+# no network) and compared by cosine similarity against a flat index per
+# (crop, language, location) partition. "tomato leaves yellow" and "yellowing
+# tomato leaf" land well above the threshold; "tomato leaves curling" does not.
+#
+# The answers were generated with the farmer's location in the prompt, so
+# location is part of the partition. Negated questions ("leaves not yellow")
+# embed almost like their positive form, so they bypass the cache entirely.
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600)))
+# Entries per partition; least recently used slots are reused
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+# Crop and location are free text, so partitions are capped too; least recently used go first
+SEMANTIC_CACHE_MAX_PARTITIONS = int(os.getenv("SEMANTIC_CACHE_MAX_PARTITIONS", "256"))
+EMBEDDING_DIM = 512
+
+_TOKEN_RE = re.compile(r"[\wऀ-ॿಀ-೿]+")
+_STOPWORDS = {
+    "a", "an", "the", "my", "is", "are", "was", "of", "in", "on", "for", "to", "and", "or",
+    "what", "why", "how", "do", "does", "i", "it", "its", "this", "these", "plant", "plants",
+    "please", "help", "me", "can", "you",
+}
+
+# English, Hindi and Kannada negations; Kannada also negates with the -ಇಲ್ಲ/-ಅಲ್ಲ suffix.
+# A false positive only costs a cache miss.
+_NEGATIONS = {
+    "not", "no", "never", "nor", "none", "without", "cannot", "dont", "doesnt", "didnt", "isnt", "arent",
+    "नहीं", "नही", "न", "ना", "मत", "बिना",
+    "ಇಲ್ಲ", "ಅಲ್ಲ", "ಬೇಡ",
+}
+_NEGATION_RE = re.compile(r"n['’]t\b")
+
+
+def has_negation(text: str) -> bool:
+    text = unicodedata.normalize("NFKC", text).lower()
+    if _NEGATION_RE.search(text):
+        return True
+    return any(w in _NEGATIONS or w.endswith("ಲ್ಲ") for w in _TOKEN_RE.findall(text))
+
+
+def _stem(word: str) -> str:
+    # Light English suffix stripping; other scripts are left untouched
+    if word.isascii():
+        for suffix in ("ing", "es", "ed", "s"):
+            if len(word) > len(suffix) + 2 and word.endswith(suffix):
+                return word[:-len(suffix)]
+    return word
+
+
+def normalize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKC", text).lower()
+    return [_stem(w) for w in _TOKEN_RE.findall(text) if w not in _STOPWORDS]
+
+
+def embed(text: str) -> np.ndarray:
+    """
+    Signed feature hashing of stemmed words (weight 2) and character trigrams
+    (weight 1), L2-normalised so a dot product is cosine similarity.
+    """
+    vec = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in normalize(text):
+        features = [("w:" + word, 2.0)]
+        padded = f"<{word}>"
+        features += [("c:" + padded[i:i + 3], 1.0) for i in range(len(padded) - 2)]
+        for feature, weight in features:
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % EMBEDDING_DIM] += weight if (h >> 32) & 1 else -weight
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class _Partition:
+    """
+    Flat inner-product index. Storage doubles as it fills up to `capacity`,
+    then the least recently used slot is reused.
+    """
+
+    INITIAL_SLOTS = 8
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        slots = min(self.INITIAL_SLOTS, capacity)
+        self.vectors = np.zeros((slots, EMBEDDING_DIM), dtype=np.float32)
+        self.entries: List[Optional[dict]] = [None] * slots
+        self.last_used = np.zeros(slots, dtype=np.float64)
+        self.size = 0
+
+    def _grow(self):
+        slots = min(len(self.entries) * 2, self.capacity)
+        extra = slots - len(self.entries)
+        self.vectors = np.vstack([self.vectors, np.zeros((extra, EMBEDDING_DIM), dtype=np.float32)])
+        self.entries += [None] * extra
+        self.last_used = np.concatenate([self.last_used, np.zeros(extra, dtype=np.float64)])
+
+    def search(self, query: np.ndarray) -> Tuple[int, float]:
+        if self.size == 0:
+            return -1, 0.0
+        scores = self.vectors[:self.size] @ query
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def add(self, vector: np.ndarray, entry: dict):
+        if self.size == len(self.entries) and self.size < self.capacity:
+            self._grow()
+        if self.size < len(self.entries):
+            slot = self.size
+            self.size += 1
+        else:
+            slot = int(np.argmin(self.last_used))
+        self.vectors[slot] = vector
+        self.entries[slot] = entry
+        self.last_used[slot] = time.time()
+
+    def expire(self, slot: int):
+        # Zero the vector so the slot can never match, and make it first to be reused
+        self.vectors[slot] = 0
+        self.entries[slot] = None
+        self.last_used[slot] = 0
+
+
+class SemanticCache:
+    def __init__(self, threshold: float, ttl: float, max_entries: int, max_partitions: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_partitions = max_partitions
+        self._partitions: "OrderedDict[Tuple[str, str, str], _Partition]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evicted_partitions = 0
+        self.saved_ms = 0.0
+
+    @staticmethod
+    def _partition_key(crop_type: Optional[str], language: Optional[str], location: Optional[str]) -> Tuple[str, str, str]:
+        return (
+            (crop_type or "").strip().lower(),
+            (language or "en").strip().lower(),
+            " ".join((location or "").lower().split()),
+        )
+
+    def lookup(
+        self, question: str, crop_type: Optional[str], language: Optional[str], location: Optional[str] = None
+    ) -> Optional[dict]:
+        if has_negation(question):
+            self.bypassed += 1
+            return None
+        key = self._partition_key(crop_type, language, location)
+        partition = self._partitions.get(key)
+        if partition is None:
+            self.misses += 1
+            return None
+        slot, score = partition.search(embed(question))
+        entry = partition.entries[slot] if slot >= 0 else None
+        if entry is None or score < self.threshold:
+            self.misses += 1
+            return None
+        if entry["created_at"] < time.time() - self.ttl:
+            partition.expire(slot)
+            self.misses += 1
+            return None
+        partition.last_used[slot] = time.time()
+        self._partitions.move_to_end(key)
+        entry["hits"] += 1
+        self.hits += 1
+        self.saved_ms += entry["latency_ms"]
+        return {"answer": entry["answer"], "similarity": round(score, 3), "question": entry["question"]}
+
+    def store(
+        self, question: str, crop_type: Optional[str], language: Optional[str], answer: str, latency_ms: float,
+        location: Optional[str] = None
+    ):
+        if has_negation(question):
+            return
+        key = self._partition_key(crop_type, language, location)
+        partition = self._partitions.get(key)
+        if partition is None:
+            partition = self._partitions[key] = _Partition(self.max_entries)
+            while len(self._partitions) > self.max_partitions:
+                self._partitions.popitem(last=False)
+                self.evicted_partitions += 1
+        else:
+            self._partitions.move_to_end(key)
+        partition.add(embed(question), {
+            "question": question,
+            "answer": answer,
+            "latency_ms": latency_ms,
+            "created_at": time.time(),
+            "hits": 0,
+        })
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "partitions": len(self._partitions),
+            "entries": sum(p.size for p in self._partitions.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed_negation": self.bypassed,
+            "evicted_partitions": self.evicted_partitions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "saved_latency_ms": round(self.saved_ms, 1),
+            "threshold": self.threshold,
+        }
+
+
+cache = SemanticCache(
+    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_MAX_PARTITIONS
+)
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Server-side chat sessions for the AI doctor.
+# Clients send a session id plus the new message; the server keeps the history
+# and the per-session prompt prefix, so requests stop growing with every turn.
+#
+# Backends implement get/put/delete on JSON-serializable session dicts, plus an
+# atomic read-modify-write update(), so a Redis (or any key-value) backend can
+# be dropped in without touching callers.
+#
+# Durable backends hand out copies, so a request handler and the background
+# summarizer/uploader each hold their own. Writers therefore never save a whole
+# copy back: they re-read the stored session inside update() and apply only
+# their own change.
+
+CHAT_SESSION_BACKEND = os.getenv("CHAT_SESSION_BACKEND", "memory")  # memory | sqlite
+CHAT_SESSION_DB = os.getenv(
+    "CHAT_SESSION_DB",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "chat_sessions.sqlite3"),
+)
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", str(7 * 24 * 3600)))
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "10000"))
+# Hard cap on stored messages; the oldest are dropped beyond this
+CHAT_SESSION_MAX_MESSAGES = int(os.getenv("CHAT_SESSION_MAX_MESSAGES", "200"))
+
+
+class SessionExpired(Exception):
+    """
+    The client resumed a session the server no longer has (restart, eviction,
+    another worker) without sending its history; it should resend it.
+    """
+    status_code = 409
+    detail = {"code": "session_expired", "message": "Session expired; resend chat_history to continue"}
+
+
+class MemorySessionBackend:
+    def __init__(self, max_sessions: int, ttl: float):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._data: "OrderedDict[str, dict]" = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        session = self._data.get(session_id)
+        if session is None:
+            return None
+        if session["updated_at"] < time.time() - self.ttl:
+            del self._data[session_id]
+            return None
+        self._data.move_to_end(session_id)
+        return session
+
+    def put(self, session: dict):
+        self._data[session["id"]] = session
+        self._data.move_to_end(session["id"])
+        while len(self._data) > self.max_sessions:
+            self._data.popitem(last=False)
+
+    def update(self, session_id: str, fn: Callable[[Optional[dict]], Optional[dict]]) -> Optional[dict]:
+        # Single-threaded on the event loop, so read-modify-write is already atomic
+        session = fn(self.get(session_id))
+        if session is not None:
+            self.put(session)
+        return session
+
+    def delete(self, session_id: str):
+        self._data.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteSessionBackend:
+    """
+    Durable backend so sessions survive restarts and can be shared by workers on one host.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at)")
+        self._conn.commit()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND updated_at > ?", (session_id, time.time() - self.ttl)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, session: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+            (session["id"], json.dumps(session, ensure_ascii=False), session["updated_at"]),
+        )
+        self._conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (time.time() - self.ttl,))
+
+    def put(self, session: dict):
+        with self._lock:
+            self._write(session)
+            self._conn.commit()
+
+    def update(self, session_id: str, fn: Callable[[Optional[dict]], Optional[dict]]) -> Optional[dict]:
+        """
+        Read, apply fn and write back in one IMMEDIATE transaction, so
+        concurrent writers (threads here, or other worker processes) serialize
+        instead of overwriting each other. fn returns the session to write, or
+        None to leave the row untouched.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM sessions WHERE id = ? AND updated_at > ?", (session_id, time.time() - self.ttl)
+                ).fetchone()
+                session = fn(json.loads(row[0]) if row else None)
+                if session is not None:
+                    self._write(session)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return session
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionStore:
+    def __init__(self, backend):
+        self.backend = backend
+        self._sqlite = isinstance(backend, SQLiteSessionBackend)
+        self.created = 0
+        self.resumed = 0
+        self.expired = 0
+
+    @staticmethod
+    def new_session(session_id: Optional[str] = None) -> dict:
+        return {
+            "id": session_id or uuid.uuid4().hex,
+            "history": [],
+            # Rolling summary of history[:summarized_upto], maintained by prompt_builder
+            "summary": "",
+            "summarized_upto": 0,
+            "prefix": None,
+            "prefix_key": None,
+            "updated_at": time.time(),
+        }
+
+    async def _run(self, fn, *args):
+        # SQLite I/O goes to a thread; the in-memory backend is cheap enough to call inline
+        if self._sqlite:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        return await self._run(self.backend.get, session_id)
+
+    async def get_or_create(self, session_id: Optional[str], seed_history: Optional[list] = None) -> dict:
+        """
+        Load a session, or start one (seeded from any client-sent history) when
+        the id is missing. An unknown or expired id is only recreated when the
+        client sent history to seed it; otherwise SessionExpired is raised so
+        the conversation context is not silently lost.
+        """
+        if session_id:
+            session = await self._run(self.backend.get, session_id)
+            if session is not None:
+                self.resumed += 1
+                return session
+            if not seed_history:
+                self.expired += 1
+                raise SessionExpired()
+        self.created += 1
+        session = self.new_session(session_id)
+        session["history"] = [
+            {"role": m.get("role", "user"), "content": m.get("content", "")} for m in (seed_history or [])
+        ]
+        return session
+
+    async def append_turn(self, session: dict, user_message: str, reply: str):
+        """
+        Persist one exchange. Only this request's delta is applied to the
+        stored session (the two new turns, the prompt prefix and a newly
+        attached photo), so summaries and upload refs written meanwhile by
+        background tasks survive.
+        """
+        turns = [{"role": "user", "content": user_message}, {"role": "ai", "content": reply}]
+
+        def apply(stored: Optional[dict]) -> dict:
+            # A session created by this request is not stored yet
+            target = session if stored is None else stored
+            target["history"].extend(turns)
+            if stored is not None:
+                stored["prefix"] = session.get("prefix")
+                stored["prefix_key"] = session.get("prefix_key")
+                image = session.get("image")
+                if image:
+                    current = stored.get("image") or {}
+                    if current.get("sha") == image.get("sha"):
+                        # Same photo: merge, keeping whichever copy already has the File API uri
+                        current.update(image)
+                        image = current
+                    stored["image"] = image
+            overflow = len(target["history"]) - CHAT_SESSION_MAX_MESSAGES
+            if overflow > 0:
+                target["history"] = target["history"][overflow:]
+                target["summarized_upto"] = max(target.get("summarized_upto", 0) - overflow, 0)
+            target["updated_at"] = time.time()
+            return target
+
+        await self._run(self.backend.update, session["id"], apply)
+
+    async def update(self, session_id: str, fn: Callable[[dict], bool]) -> bool:
+        """
+        Apply fn to the stored session atomically. fn mutates it and returns
+        True to save, False to leave it (e.g. a compare-and-set that lost).
+        Returns whether a write happened; a missing session is never created.
+        """
+        def apply(stored: Optional[dict]) -> Optional[dict]:
+            if stored is None or not fn(stored):
+                return None
+            stored["updated_at"] = time.time()
+            return stored
+
+        return await self._run(self.backend.update, session_id, apply) is not None
+
+    async def save(self, session: dict):
+        session["updated_at"] = time.time()
+        await self._run(self.backend.put, session)
+
+    async def delete(self, session_id: str):
+        await self._run(self.backend.delete, session_id)
+
+    def stats(self) -> dict:
+        return {
+            "backend": CHAT_SESSION_BACKEND,
+            "sessions": len(self.backend),
+            "created": self.created,
+            "resumed": self.resumed,
+            "expired": self.expired,
+        }
+
+
+def _make_backend():
+    if CHAT_SESSION_BACKEND == "sqlite":
+        return SQLiteSessionBackend(CHAT_SESSION_DB, CHAT_SESSION_TTL)
+    return MemorySessionBackend(CHAT_SESSION_MAX, CHAT_SESSION_TTL)
+
+
+store = SessionStore(_make_backend())
@@ -0,0 +1,80 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Build a normalized key from arbitrary JSON-serializable parts.
+    Large payloads (images, prompts) are hashed so keys stay small.
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one upstream request.
+
+    The first caller for a key starts the work as a task; everyone arriving
+    while it is in flight awaits the same task. A caller being cancelled
+    (client disconnect) does not cancel the shared work for the others.
+    """
+
+    def __init__(self, name: str, max_tracked_keys: int = 1024):
+        self.name = name
+        self.max_tracked_keys = max_tracked_keys
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        # key -> {"calls": n, "coalesced": n}, LRU-bounded so stats can't grow forever
+        self._key_stats: "OrderedDict[str, dict]" = OrderedDict()
+        self.calls = 0
+        self.coalesced = 0
+
+    def _record(self, key: str, coalesced: bool):
+        self.calls += 1
+        entry = self._key_stats.pop(key, None) or {"calls": 0, "coalesced": 0}
+        entry["calls"] += 1
+        if coalesced:
+            self.coalesced += 1
+            entry["coalesced"] += 1
+        self._key_stats[key] = entry
+        while len(self._key_stats) > self.max_tracked_keys:
+            self._key_stats.popitem(last=False)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._record(key, coalesced=True)
+        else:
+            self._record(key, coalesced=False)
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self, top: int = 10) -> dict:
+        busiest = sorted(self._key_stats.items(), key=lambda kv: kv[1]["coalesced"], reverse=True)[:top]
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "top_keys": [{"key": k[:16], **v} for k, v in busiest],
+        }
+
+
+# One group per upstream so stats can be read separately
+open_meteo = SingleFlight("open_meteo")
+plant_id = SingleFlight("plant_id")
+gemini = SingleFlight("gemini")
+
+
+def stats() -> dict:
+    return {g.name: g.stats() for g in (open_meteo, plant_id, gemini)}
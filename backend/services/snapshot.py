@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+
+# Hot-reloaded, immutable in-memory views of a JSON data file, plus the
+# response helpers the routers serving them share: pre-serialized JSON bodies
+# with strong ETags (304 on revalidation) and Server-Sent Event framing.
+
+
+def serialize(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def not_modified(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or tag in tags
+
+
+def respond(request: Request, body: bytes, tag: Optional[str] = None, max_age: int = 0) -> Response:
+    """
+    Send pre-serialized JSON directly (no response_model validation), or a
+    304 when the client already has this version.
+    """
+    tag = tag or etag(body)
+    headers = {"ETag": tag, "Cache-Control": f"public, max-age={max_age}"}
+    if not_modified(request, tag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def file_version(path: str) -> tuple:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class Snapshot:
+    """
+    The current build of a JSON file. `build(data, version)` turns the parsed
+    file into an immutable object; reloads build a new one and swap it in, and
+    a bad file keeps the previous build serving. A watcher task polls the
+    file's mtime and size and reloads off the event loop when they change.
+    """
+
+    def __init__(
+        self, name: str, path: str, build: Callable[[Any, tuple], Any], reload_interval: float,
+        on_load: Optional[Callable[[Any], None]] = None
+    ):
+        self.name = name
+        self.path = path
+        self.build = build
+        self.reload_interval = reload_interval
+        self.on_load = on_load
+        self.current = None
+        self.version: Optional[tuple] = None
+        self.loaded_at = 0.0
+        self._stats = {"reloads": 0, "reload_errors": 0}
+        self._watcher: Optional[asyncio.Task] = None
+
+    def load(self):
+        try:
+            version = file_version(self.path)
+            with open(self.path, encoding="utf-8") as f:
+                built = self.build(json.load(f), version)
+        except Exception as e:
+            self._stats["reload_errors"] += 1
+            print(f"{self.name} Load Error: {e}")
+            if self.current is None:
+                self._swap(self.build([], (0, 0)), (0, 0))
+            return
+        self._swap(built, version)
+        self._stats["reloads"] += 1
+
+    def _swap(self, built, version: tuple):
+        self.current, self.version, self.loaded_at = built, version, time.time()
+        if self.on_load is not None:
+            self.on_load(built)
+
+    def get(self):
+        if self.current is None:
+            self.load()
+        return self.current
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                changed = file_version(self.path) != self.version
+            except OSError:
+                continue
+            if changed:
+                # Parsing and indexing a large file should not stall the event loop
+                await asyncio.to_thread(self.load)
+
+    def start_watcher(self):
+        if self._watcher is None:
+            self._watcher = asyncio.ensure_future(self._watch())
+
+    async def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    def stats(self) -> dict:
+        return {**self._stats, "loaded_at": self.loaded_at}
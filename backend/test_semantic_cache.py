@@ -0,0 +1,43 @@
+"""
+Semantic cache partitioning regressions.
+
+    python test_semantic_cache.py      (or: python -m pytest test_semantic_cache.py)
+"""
+from services import semantic_cache
+
+QUESTION = "tomato leaves turning yellow"
+ANSWER = "Likely nitrogen deficiency."
+
+
+def _cache(max_partitions: int = 8) -> semantic_cache.SemanticCache:
+    return semantic_cache.SemanticCache(threshold=0.85, ttl=3600, max_entries=16, max_partitions=max_partitions)
+
+
+def test_location_answer_not_served_without_location():
+    cache = _cache()
+    cache.store(QUESTION, "Tomato", "en", ANSWER, 1200.0, location="Mandya")
+
+    assert cache.lookup(QUESTION, "Tomato", "en", location=None) is None
+    assert cache.lookup(QUESTION, "Tomato", "en", location="Mysuru") is None
+    hit = cache.lookup(QUESTION, "tomato", "en", location="  mandya ")
+    assert hit is not None and hit["answer"] == ANSWER
+
+
+def test_partitions_are_capped_least_recently_used_first():
+    cache = _cache(max_partitions=2)
+    cache.store(QUESTION, "Tomato", "en", ANSWER, 1.0, location="Mandya")
+    cache.store(QUESTION, "Tomato", "en", ANSWER, 1.0, location="Mysuru")
+    assert cache.lookup(QUESTION, "Tomato", "en", location="Mandya") is not None
+    cache.store(QUESTION, "Tomato", "en", ANSWER, 1.0, location="Hassan")
+
+    stats = cache.stats()
+    assert (stats["partitions"], stats["evicted_partitions"]) == (2, 1)
+    assert cache.lookup(QUESTION, "Tomato", "en", location="Mysuru") is None
+    assert cache.lookup(QUESTION, "Tomato", "en", location="Mandya") is not None
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"{name}: ok")
@@ -0,0 +1,138 @@
+"""
+Session store regressions on the SQLite backend, where every reader gets its
+own copy of the session.
+
+    python test_sessions.py      (or: python -m pytest test_sessions.py)
+
+The summary model is replaced by a local fake, so no API key is needed.
+"""
+import asyncio
+import contextlib
+import os
+import tempfile
+import types
+
+from services import prompt_builder, sessions
+
+
+class FakeSummaryModel:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt, **kwargs):
+        self.calls += 1
+        return f"summary {self.calls}"
+
+
+def _sqlite_store() -> sessions.SessionStore:
+    path = os.path.join(tempfile.mkdtemp(), "sessions.sqlite3")
+    return sessions.SessionStore(sessions.SQLiteSessionBackend(path, sessions.CHAT_SESSION_TTL))
+
+
+@contextlib.contextmanager
+def _installed(store: sessions.SessionStore):
+    """
+    Swap in the store and a fake summary model, restoring the module globals
+    afterwards so later tests in the same process see the real ones.
+    """
+    model = FakeSummaryModel()
+    original_store, original_llm = sessions.store, prompt_builder.llm
+    sessions.store = store
+    prompt_builder.llm = types.SimpleNamespace(get_model=lambda name: model)
+    try:
+        yield model
+    finally:
+        sessions.store, prompt_builder.llm = original_store, original_llm
+
+
+async def _turn(store, session_id, message, budget):
+    """
+    One doctor request: load, build the prompt (which may schedule a
+    summary), let the summarizer finish while the handler still holds its
+    copy, then append the turn from that stale copy.
+    """
+    session = await store.get_or_create(session_id)
+    usage = prompt_builder.build(session, "PREFIX\n", message, budget=budget)["usage"]
+    if prompt_builder._tasks:
+        await asyncio.gather(*prompt_builder._tasks)
+    await store.append_turn(session, message, "reply " + message)
+    return session["id"], usage
+
+
+def test_summary_survives_stale_append():
+    async def run(store, model):
+        summaries = prompt_builder._stats["summaries"]
+        session_id, pending = None, []
+        for i in range(8):
+            session_id, usage = await _turn(store, session_id, f"question {i} " + "word " * 40, budget=120)
+            pending.append(usage["turns_pending_summary"])
+
+        stored = await store.get(session_id)
+        assert stored["summary"], "summary was overwritten by a stale append"
+        assert stored["summarized_upto"] > 0
+        assert len(stored["history"]) == 16
+        # Every summary call landed, and the backlog stays bounded instead of growing per turn
+        assert prompt_builder._stats["summaries"] - summaries == model.calls
+        assert max(pending[-4:]) <= 2, pending
+
+    store = _sqlite_store()
+    with _installed(store) as model:
+        asyncio.run(run(store, model))
+
+
+def test_concurrent_appends_keep_both_turns():
+    async def run(store):
+        session = await store.get_or_create(None)
+        await store.append_turn(session, "first", "reply first")
+
+        a = await store.get(session["id"])
+        b = await store.get(session["id"])
+        await asyncio.gather(store.append_turn(a, "from a", "reply a"), store.append_turn(b, "from b", "reply b"))
+
+        contents = [m["content"] for m in (await store.get(session["id"]))["history"]]
+        assert contents[:2] == ["first", "reply first"]
+        assert sorted(contents[2:]) == ["from a", "from b", "reply a", "reply b"]
+
+    store = _sqlite_store()
+    with _installed(store):
+        asyncio.run(run(store))
+
+
+def test_summary_write_is_compare_and_set():
+    async def run(store):
+        session = await store.get_or_create(None)
+        for i in range(3):
+            await store.append_turn(session, f"q{i}", f"a{i}")
+
+        def summarize_from(start, text):
+            def apply(stored):
+                if stored.get("summarized_upto", 0) != start:
+                    return False
+                stored["summary"] = text
+                stored["summarized_upto"] = 4
+                return True
+            return apply
+
+        assert await store.update(session["id"], summarize_from(0, "fresh"))
+        # A second summarizer that started from the same point has lost the race
+        assert not await store.update(session["id"], summarize_from(0, "stale"))
+        stored = await store.get(session["id"])
+        assert (stored["summary"], stored["summarized_upto"]) == ("fresh", 4)
+
+    store = _sqlite_store()
+    with _installed(store):
+        asyncio.run(run(store))
+
+
+def test_globals_are_restored():
+    original_store, original_llm = sessions.store, prompt_builder.llm
+    with _installed(_sqlite_store()):
+        pass
+    assert (sessions.store, prompt_builder.llm) == (original_store, original_llm)
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"{name}: ok")
@@ -12,9 +12,11 @@ import { GlowingEffect } from "@/components/ui/glowing-effect";
 
 interface ClimateData {
     comparison: {
-        year_1990: number;
-        year_2023: number;
+        past: number;
+        latest: number;
         diff: number;
+        past_year: number;
+        latest_year: number;
     };
     insight: string;
 }
@@ -83,8 +85,8 @@ export function ClimateCard() {
 
                     <div className="space-y-3">
                         <div className="flex items-center justify-between text-sm">
-                            <span className="text-slate-500">1990 Avg</span>
-                            <span className="font-semibold">{data.comparison.year_1990}°C</span>
+                            <span className="text-slate-500">{data.comparison.past_year} Avg</span>
+                            <span className="font-semibold">{data.comparison.past}°C</span>
                         </div>
 
                         <div className="relative h-2 bg-slate-200 rounded-full overflow-hidden">
@@ -99,8 +101,8 @@ export function ClimateCard() {
                         </div>
 
                         <div className="flex items-center justify-between text-sm">
-                            <span className="text-slate-500">Today</span>
-                            <span className="font-semibold text-orange-600">{data.comparison.year_2023}°C</span>
+                            <span className="text-slate-500">{data.comparison.latest_year} Avg</span>
+                            <span className="font-semibold text-orange-600">{data.comparison.latest}°C</span>
                         </div>
 
                         <p className="text-xs text-slate-500 mt-2 bg-white/50 p-2 rounded border border-orange-100">
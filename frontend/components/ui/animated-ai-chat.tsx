@@ -89,6 +89,7 @@ export function AnimatedAIChat() {
     const [loading, setLoading] = useState(false);
     const [inputFocused, setInputFocused] = useState(false);
     const [selectedLang, setSelectedLang] = useState("en");
+    const [sessionId, setSessionId] = useState<string | null>(null);
 
     const fileInputRef = useRef<HTMLInputElement>(null);
     const messagesEndRef = useRef<HTMLDivElement>(null);
@@ -124,15 +125,32 @@ export function AnimatedAIChat() {
         setLoading(true);
 
         const langLabel = LANGUAGES.find((l) => l.code === selectedLang)?.label ?? "English";
-        try {
-            const res = await axios.post("http://localhost:8000/api/doctor/diagnose", {
+        const history = messages.map((m) => ({ role: m.role, content: m.content }));
+        const diagnose = (withHistory: boolean) =>
+            axios.post("http://localhost:8000/api/doctor/diagnose", {
                 message: img ? `[Image attached] ${text || "Diagnose this crop image."}` : text,
-                chat_history: messages.map((m) => ({ role: m.role, content: m.content })),
+                session_id: sessionId,
+                // The server keeps history once a session exists
+                chat_history: withHistory ? history : [],
                 language: selectedLang,
                 language_name: langLabel,
                 image_base64: img ?? null,
             });
+        try {
+            let res;
+            try {
+                res = await diagnose(!sessionId);
+            } catch (err) {
+                // The server lost the session (restart, eviction, another worker): resend the history once
+                if (sessionId && axios.isAxiosError(err) && err.response?.status === 409
+                    && err.response.data?.detail?.code === "session_expired") {
+                    res = await diagnose(true);
+                } else {
+                    throw err;
+                }
+            }
             const d = res.data;
+            if (d.session_id) setSessionId(d.session_id);
             setMessages((p) => [
                 ...p,
                 {